@@ -1,8 +1,22 @@
-
 import numpy as np
-import scipy.io.wavfile as wavfile
 import argparse
+import bz2
+import collections
+import contextlib
+import dataclasses
+import functools
+import itertools
+import json
+import lzma
+import math
+import mmap
 import os
+import stat
+import struct
+import sys
+import threading
+import time
+import zlib
 
 # --- MFSK Configuration ---
 # Using 16 frequencies to represent 4 bits per symbol (2^4 = 16)
@@ -20,154 +34,3173 @@ FREQUENCIES = np.arange(NUM_FREQUENCIES) * FREQUENCY_STEP + BASE_FREQUENCY
 # Sync header remains the same, but can be shorter as detection is robust
 SYNC_HEADER_FREQ = 5000 # A distinct frequency outside the data range
 SYNC_HEADER_DURATION = 0.3 # s
+SYNC_GUARD = 1000 # Hz. Minimum gap above the highest data tone; wide alphabets push the sync tone up.
+CARRIER_GUARD_TONES = 1 # Unused tone slots between the sub-bands of a multi-carrier profile
 
 SAMPLES_PER_SYMBOL = int(SAMPLE_RATE * SYMBOL_DURATION)
 SAMPLES_PER_SYNC_HEADER = int(SAMPLE_RATE * SYNC_HEADER_DURATION)
 
+# Sync search: windows scoring at least SYNC_MIN_SCORE (fraction of energy that is sync tone)
+# are headers; the file head is scanned SYNC_SEARCH_BLOCK samples at a time.
+SYNC_MIN_SCORE = 0.02
+SYNC_SEARCH_BLOCK = 1 << 20
+# Lags either side of the sync correlation peak checked against the sync tone's phase: SYNC_REFINE_PERIODS
+# periods of the tone, but at least SYNC_REFINE_SAMPLES, as the envelope peak lands up to several samples late.
+SYNC_REFINE_PERIODS = 2
+SYNC_REFINE_SAMPLES = 8
+
+# Symbol periods synthesized per streamed encode block (~10.8 MB of audio). A multiple of 8, so every
+# block holds whole bytes for any bits-per-symbol and carrier count.
+ENCODE_BLOCK_SYMBOLS = 4096
+
+# Symbols demodulated per batched FFT. Bounds the spectrum matrix to a few tens of MB.
+DEMOD_BATCH_SYMBOLS = 4096
+
+# Audio recorded at another rate than it was synthesized at is demodulated at its own rate, where a symbol
+# period may span a fractional number of samples. Its windows may overrun the period by up to this fraction
+# to reach a length with only FFT_SMOOTH_PRIMES as factors, which numpy's FFT handles several times faster
+# than a length with a large prime factor.
+WINDOW_MAX_OVERRUN = 0.01
+FFT_SMOOTH_PRIMES = (2, 3, 5, 7, 11)
+
+# Symbols per task when decoding with a process pool (a multiple of 8, so ranges split on byte boundaries).
+PARALLEL_RANGE_SYMBOLS = 8 * DEMOD_BATCH_SYMBOLS
+# Framed blocks queued per worker ahead of the one being written. A streamed payload can end long before
+# the blocks its recording has room for, so they are not all submitted at once.
+PARALLEL_BLOCKS_AHEAD = 2
+
+# A lane whose last symbol period has less than this fraction of the previous period's energy was
+# padded with silence by the encoder.
+LANE_SILENCE_RATIO = 0.01
+SYNTHESIS_MODES = ('reset', 'cpfsk')  # Per-symbol phase reset, or continuous phase across symbols
+MAX_EDGE_RAMP = 0.5  # A symbol's rising and falling edge tapers may at most meet in the middle
+
+# Self-describing streams: right after a sync header at the legacy 5000 Hz comes a preamble, modulated
+# with the legacy 16-tone plan, carrying the data's tone plan and its framing, compression and FEC
+# settings, a CRC32 and PREAMBLE_FEC_SYMBOLS bytes of Reed-Solomon parity. The data follows in its own
+# tone plan.
+PREAMBLE_MAGIC = b'WP'
+PREAMBLE_VERSION = 1
+PREAMBLE_FORMAT = '<2sBIdBBffBB'
+PREAMBLE_SIZE = struct.calcsize(PREAMBLE_FORMAT) + 4
+PREAMBLE_FEC_SYMBOLS = 16
+PREAMBLE_FLAG_FRAMED = 0x01 # Bits 1-2 hold the codec id, as in the frame header flags
+
+# Calibration: candidate symbol durations form a geometric ladder, tone spacings are these multiples of
+# the FFT bin width. Probe recordings hold one section per candidate, each a sync header plus random
+# symbols seeded from CALIBRATION_SEED, separated by CALIBRATION_GAP seconds of silence; a section's sync
+# is searched for within CALIBRATION_SEARCH_MARGIN seconds of where the layout puts it.
+CALIBRATION_SPACING_FACTORS = (1., 1.5, 2., 3., 4.)
+CALIBRATION_SEED = 0x5EED
+CALIBRATION_GAP = 0.25
+CALIBRATION_SEARCH_MARGIN = 0.2
+
+# Calibrated profiles are saved as PROFILE_DIR/NAME.json.
+PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.wavetrans', 'profiles')
+
+# Framed format: a header (magic, version, flags, tone plan, block size, payload length, CRC32), then the
+# payload in blocks of FRAME_BLOCK_SIZE bytes each followed by its CRC32. Header and blocks each start on
+# a symbol period boundary, so any block can be demodulated on its own.
+FRAME_MAGIC = b'MFSK'
+FRAME_VERSION = 2
+FRAME_HEADER_FORMAT = '<4sBBBBBIffIQ'
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FORMAT) + 4
+FRAME_BLOCK_SIZE = 4096
+FRAME_CRC_SIZE = 4
+FRAME_RETRY_OFFSETS = (-2, -1, 1, 2) # Sample shifts tried on blocks failing their CRC with every detector
+
+# Reed-Solomon FEC over GF(256) (primitive polynomial 0x11D, generator 2, codewords of up to 255 bytes).
+# With FEC the header is followed by FRAME_HEADER_FEC_SYMBOLS parity bytes and every block carries
+# --fec parity bytes per codeword, its codewords interleaved byte by byte.
+FRAME_FLAG_FEC = 0x01
+FRAME_HEADER_FEC_SYMBOLS = 16
+RS_CODEWORD_SIZE = 255
+RS_MAX_PARITY = 128
+RS_BATCH_CODEWORDS = 512 # Codewords per vectorized table lookup, bounding its (codewords x 255 x parity) temporary
+
+# Compression before framing. The codec's id is stored in bits 1-2 of the frame header flags. Automatic
+# selection compresses COMPRESS_SAMPLE_CHUNKS chunks spread over the input with every codec and keeps the
+# smallest, unless it saves less than COMPRESS_MIN_SAVING.
+FRAME_CODEC_SHIFT = 1
+FRAME_CODEC_MASK = 0x06
+COMPRESS_CHUNK_SIZE = 1 << 16
+COMPRESS_SAMPLE_CHUNKS = 8
+COMPRESS_MIN_SAVING = 0.05
+COMPRESS_SPOOL_SIZE = 64 << 20 # Compressed output is kept in memory up to this size, then spooled to disk
+
+# Streamed framing, for input whose length is not known up front (a pipe). The header then carries
+# FRAME_FLAG_STREAMED and a payload length of 0, and every block has the same size: a FRAME_LENGTH_SIZE-byte
+# count of the payload bytes it holds, block_size bytes zero-padded past them, then the CRC. The first
+# block holding fewer than block_size bytes, empty if need be, ends the payload.
+FRAME_FLAG_STREAMED = 0x08
+FRAME_LENGTH_SIZE = 4
+
+# '-' as an encode or decode path stands for stdin or stdout; progress messages then go to stderr.
+STDIO_PATH = '-'
+STDIO_PREFETCH_SEGMENTS = 4 # Segments read ahead from a pipe while the previous ones are synthesized
+
+# WAV format tags read natively; anything else is handed to scipy.io.wavfile, imported on demand.
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+STARTUP_BENCH_BYTES = 64 # Payload of the tiny encode timed by bench startup
+SYNC_BENCH_BYTES = 64 # Payload after each sync header placed by bench sync
+SYNC_BENCH_BITS = (4, 5, 6, 7, 8) # Alphabet widths bench sync covers; from 7 bits up the sync tone moves above 5 kHz
+
+# Live decoding. A stream is taken as framed only if at least this many of its first bytes match
+# FRAME_MAGIC (the header may be Reed-Solomon corrected), so unframed data flows without waiting for a
+# whole header's worth of audio.
+STREAM_MAGIC_MATCHES = 2
+# Likewise, the whole preamble is awaited after a legacy sync header only if at least this many bytes of
+# PREAMBLE_MAGIC, which open its Reed-Solomon codeword, are received as sent by one of the detectors.
+PREAMBLE_MAGIC_MATCHES = 1
+STREAM_READ_SIZE = 1 << 16 # Bytes asked of the sample stream per read; whatever has arrived is returned
+
+# Stage statistics of encode/decode --profile and --stats-json, in the order they are reported.
+ENCODE_STAGES = ('read', 'compression', 'framing', 'bit-packing', 'synthesis', 'write')
+DECODE_STAGES = ('read', 'sync search', 'demodulation', 'framing', 'byte packing', 'decompression', 'write')
+
+class StageStats:
+    """Wall time, CPU time and calls per pipeline stage, plus counts of symbols and bytes processed.
+
+    CPU time is that of the thread running the stage (the encoder reads pipes in a second thread), and a
+    stage running inside another is not charged to it. Work done in a process pool shows up as the wall
+    time spent waiting for it.
+    """
+
+    def __init__(self):
+        self.stages = {} # name -> [wall seconds, CPU seconds, calls]
+        self.counts = collections.Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start = (time.perf_counter(), time.process_time(), resource_usage()[2])
+
+    def _charge(self, name, wall, cpu, calls):
+        with self.lock:
+            entry = self.stages.setdefault(name, [0., 0., 0])
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += calls
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self.local.__dict__.setdefault('stack', [])
+        now = (time.perf_counter(), time.thread_time())
+        if stack:
+            parent = stack[-1]
+            self._charge(parent[0], now[0] - parent[1], now[1] - parent[2], 0)
+        stack.append([name, *now])
+        try:
+            yield
+        finally:
+            now = (time.perf_counter(), time.thread_time())
+            _, wall_start, cpu_start = stack.pop()
+            self._charge(name, now[0] - wall_start, now[1] - cpu_start, 1)
+            if stack:
+                stack[-1][1:] = now
+
+    def count(self, name, amount):
+        with self.lock:
+            self.counts[name] += amount
+
+    def summary(self, command, input_path, output_path):
+        """The statistics as a JSON-ready dict; rates are per second of total wall time."""
+        wall = time.perf_counter() - self.start[0]
+        order = ENCODE_STAGES if command == 'encode' else DECODE_STAGES
+        names = sorted(self.stages, key=lambda name: order.index(name) if name in order else len(order))
+        rss, worker_rss, worker_cpu = resource_usage()
+        if worker_cpu is not None:
+            # Children that ended before collection started (e.g. a launcher's) are not this run's workers
+            worker_cpu -= self.start[2]
+            worker_rss = worker_rss if worker_cpu > 0 else None
+        return {
+            'command': command, 'input': input_path, 'output': output_path,
+            'wall_seconds': wall, 'cpu_seconds': time.process_time() - self.start[1],
+            'worker_cpu_seconds': worker_cpu,
+            'stages': {name: dict(zip(('wall_seconds', 'cpu_seconds', 'calls'), self.stages[name])) for name in names},
+            'symbols': self.counts['symbols'], 'bytes': self.counts['bytes'],
+            'symbols_per_second': self.counts['symbols'] / wall if wall else 0.,
+            'bytes_per_second': self.counts['bytes'] / wall if wall else 0.,
+            'peak_rss_bytes': rss, 'worker_peak_rss_bytes': worker_rss,
+        }
+
+_stats = None # The StageStats being collected, if any
+
+def stage(name):
+    """Context timing a pipeline stage while statistics are collected; a no-op otherwise."""
+    return _stats.stage(name) if _stats is not None else contextlib.nullcontext()
+
+def count_processed(name, amount):
+    """Adds amount to the 'symbols' or 'bytes' count while statistics are collected."""
+    if _stats is not None:
+        _stats.count(name, amount)
+
+def resource_usage():
+    """Returns (peak RSS of this process, peak RSS of its largest finished child, CPU seconds of its
+    finished children), with Nones where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None, None, None
+    scale = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is in bytes on macOS, KiB elsewhere
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_maxrss * scale, children.ru_maxrss * scale, children.ru_utime + children.ru_stime
+
+@functools.lru_cache(maxsize=32)
+def fft_window_length(minimum, maximum):
+    """Smallest length in [minimum, maximum] with only FFT_SMOOTH_PRIMES as factors, or minimum if there
+    is none."""
+    for length in range(minimum, maximum + 1):
+        remainder = length
+        for prime in FFT_SMOOTH_PRIMES:
+            while remainder % prime == 0:
+                remainder //= prime
+        if remainder == 1:
+            return length
+    return minimum
+
 def generate_tone(frequency, duration, sample_rate, amplitude):
     """Generates a sine wave tone."""
     t = np.linspace(0., duration, int(sample_rate * duration), endpoint=False)
     return (amplitude * np.sin(2. * np.pi * frequency * t)).astype(np.int16)
 
-def encode(input_path, output_path):
-    """Encodes a file into a high-density MFSK WAV audio file."""
-    print(f"Reading data from '{input_path}'...")
-    try:
-        with open(input_path, 'rb') as f:
-            data = f.read()
-    except FileNotFoundError:
-        print(f"Error: Input file not found at '{input_path}'")
+def build_tone_templates(frequencies, duration, sample_rate, amplitude):
+    """Synthesizes one symbol-length tone per frequency, stacked as rows of an int16 matrix."""
+    return np.stack([generate_tone(freq, duration, sample_rate, amplitude) for freq in frequencies])
+
+@dataclasses.dataclass(frozen=True)
+class ModemProfile:
+    """Modulation parameters that encoder and decoder must agree on.
+
+    The alphabet has 2**bits_per_symbol tones starting at base_frequency. tone_spacing defaults to the
+    FFT bin width of one symbol window (sample_rate / samples_per_symbol), the tightest spacing at which
+    the tones stay orthogonal. With carriers > 1, that many alphabets sit side by side in disjoint
+    sub-bands (CARRIER_GUARD_TONES apart) and each symbol period sends one tone in every sub-band,
+    carrying carriers * bits_per_symbol bits.
+
+    source_rate is only set on the profiles at_rate makes for demodulating audio recorded at another
+    rate than the signal was synthesized at.
+    """
+    bits_per_symbol: int = 4
+    symbol_duration: float = SYMBOL_DURATION
+    tone_spacing: float = None
+    base_frequency: float = BASE_FREQUENCY
+    sample_rate: int = SAMPLE_RATE
+    amplitude: int = AMPLITUDE
+    carriers: int = 1
+    source_rate: int = None
+
+    def __post_init__(self):
+        if not 1 <= self.bits_per_symbol <= 8:
+            raise ValueError(f"bits_per_symbol must be between 1 and 8, got {self.bits_per_symbol}.")
+        if self.carriers < 1:
+            raise ValueError(f"carriers must be at least 1, got {self.carriers}.")
+        if not math.isfinite(self.symbol_duration):
+            raise ValueError(f"symbol_duration must be finite, got {self.symbol_duration}.")
+        if self.samples_per_symbol < 2:
+            raise ValueError(f"symbol_duration of {self.symbol_duration} s is shorter than two samples.")
+        if self.tone_spacing is None:
+            object.__setattr__(self, 'tone_spacing', self.sample_rate / self.samples_per_symbol)
+        if not (self.tone_spacing > 0 and math.isfinite(self.tone_spacing)):
+            raise ValueError(f"tone_spacing must be positive and finite, got {self.tone_spacing}.")
+        if self.sync_frequency >= self.sample_rate / 2:
+            raise ValueError(f"Tone plan needs {self.sync_frequency:.0f} Hz, above the Nyquist frequency "
+                             f"of {self.sample_rate} Hz audio.")
+
+    @property
+    def num_tones(self):
+        return 1 << self.bits_per_symbol
+
+    @property
+    def bits_per_period(self):
+        return self.bits_per_symbol * self.carriers
+
+    @property
+    def tone_amplitude(self):
+        """Amplitude of each simultaneous tone, so that their sum stays within amplitude."""
+        return self.amplitude // self.carriers
+
+    @property
+    def samples_per_symbol(self):
+        """Samples in a symbol window; with a source_rate, the whole samples of a symbol period or a
+        little more (see WINDOW_MAX_OVERRUN)."""
+        if self.source_rate is None:
+            return int(self.sample_rate * self.symbol_duration)
+        period = self.symbol_period
+        return fft_window_length(int(period), int(period * (1 + WINDOW_MAX_OVERRUN)))
+
+    @property
+    def symbol_period(self):
+        """Samples from one symbol's start to the next, fractional for audio recorded off the source_rate."""
+        if self.source_rate is None:
+            return self.samples_per_symbol
+        return int(self.source_rate * self.symbol_duration) * self.sample_rate / self.source_rate
+
+    def period_offsets(self, periods):
+        """Offsets from the data start, in samples, of the symbol periods with the given index or array
+        of indices. Fractional periods start on the nearest sample."""
+        if self.source_rate is None:
+            return periods * self.samples_per_symbol
+        return np.rint(np.multiply(periods, self.symbol_period)).astype(np.int64)
+
+    def periods_in(self, num_samples, ended=True):
+        """Number of whole symbol windows in num_samples samples after a data start.
+
+        Off the source_rate, the last window of a recording that has ended may fall short by up to its
+        WINDOW_MAX_OVERRUN (plus rounding); demodulate_range pads it with silence.
+        """
+        if self.source_rate is None:
+            return max(num_samples, 0) // self.samples_per_symbol
+        if ended:
+            num_samples += int(self.symbol_period * WINDOW_MAX_OVERRUN) + 2
+        if num_samples < self.samples_per_symbol:
+            return 0
+        count = int((num_samples - self.samples_per_symbol) // self.symbol_period) + 1
+        return count - 1 if self.period_offsets(count - 1) + self.samples_per_symbol > num_samples else count
+
+    def at_rate(self, sample_rate):
+        """This tone plan as recorded at sample_rate: the same tones and symbol timing in seconds, with
+        windows and symbol periods counted in samples at that rate, so the recording is demodulated as
+        it is rather than resampled first."""
+        if sample_rate == self.sample_rate:
+            return self
+        return dataclasses.replace(self, sample_rate=sample_rate, source_rate=self.sample_rate)
+
+    @property
+    def source(self):
+        """The profile the signal was synthesized with (self unless made by at_rate)."""
+        if self.source_rate is None:
+            return self
+        return dataclasses.replace(self, sample_rate=self.source_rate, source_rate=None)
+
+    @property
+    def samples_per_sync_header(self):
+        return int(self.sample_rate * SYNC_HEADER_DURATION)
+
+    @functools.cached_property
+    def frequencies(self):
+        """All tones, sub-band by sub-band: tone i of carrier c is frequencies[c * num_tones + i]."""
+        carrier_offsets = (self.num_tones + CARRIER_GUARD_TONES) * np.arange(self.carriers)
+        slots = carrier_offsets[:, np.newaxis] + np.arange(self.num_tones)
+        return slots.reshape(-1) * self.tone_spacing + self.base_frequency
+
+    @property
+    def sync_frequency(self):
+        return float(max(SYNC_HEADER_FREQ, self.frequencies[-1] + SYNC_GUARD))
+
+    @functools.cached_property
+    def tone_templates(self):
+        """The alphabet's tones, synthesized once per profile."""
+        return build_tone_templates(self.frequencies, self.symbol_duration, self.sample_rate, self.tone_amplitude)
+
+    @functools.cached_property
+    def quadrature_templates(self):
+        """Float32 sine and cosine rows of every tone over one symbol, for continuous-phase synthesis."""
+        phase = 2. * np.pi * self.frequencies[:, np.newaxis] * np.arange(self.samples_per_symbol) / self.sample_rate
+        return (self.tone_amplitude * np.sin(phase)).astype(np.float32), (self.tone_amplitude * np.cos(phase)).astype(np.float32)
+
+    @functools.cached_property
+    def phase_advances(self):
+        """Phase each tone advances by over one symbol, modulo 2 pi."""
+        return 2. * np.pi * self.frequencies * self.samples_per_symbol / self.sample_rate % (2. * np.pi)
+
+    @functools.cached_property
+    def sync_tone(self):
+        return generate_tone(self.sync_frequency, SYNC_HEADER_DURATION, self.sample_rate, self.amplitude)
+
+    def symbols_for_bytes(self, byte_count):
+        """Number of symbol periods needed to carry byte_count bytes (the last one is zero-padded)."""
+        return -(-8 * byte_count // self.bits_per_period)
+
+    def describe(self):
+        return (f"{self.bits_per_symbol} bits x {self.carriers} carrier(s), {self.symbol_duration * 1000:g} ms "
+                f"symbols, {self.tone_spacing:.1f} Hz spacing from {self.base_frequency:g} Hz at {self.sample_rate} Hz")
+
+# The original 16-tone, 150 Hz-spaced plan; files encoded without options use it.
+DEFAULT_PROFILE = ModemProfile(tone_spacing=FREQUENCY_STEP)
+
+def bytes_to_symbols(data, bits_per_symbol):
+    """Splits bytes into a stream of bits_per_symbol-bit symbol values, most significant bits first.
+
+    The last symbol is zero-padded when the bit count is not a multiple of bits_per_symbol.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if bits_per_symbol == 8:
+        return raw
+    if bits_per_symbol == 4:
+        values = np.empty(2 * len(raw), dtype=np.uint8)
+        values[0::2] = raw >> 4
+        values[1::2] = raw & 0x0F
+        return values
+    bits = np.unpackbits(raw)
+    bits = np.append(bits, np.zeros(-len(bits) % bits_per_symbol, dtype=np.uint8))
+    # packbits left-aligns each row of bits_per_symbol bits in a byte
+    return np.packbits(bits.reshape(-1, bits_per_symbol), axis=1)[:, 0] >> (8 - bits_per_symbol)
+
+def symbols_to_bytes(values, bits_per_symbol):
+    """Packs bits_per_symbol-bit symbol values back into bytes, dropping a trailing partial byte."""
+    values = values.astype(np.uint8, copy=False)
+    if bits_per_symbol == 8:
+        return values
+    if bits_per_symbol == 4:
+        byte_count = len(values) // 2
+        return (values[0:2 * byte_count:2] << 4) | values[1:2 * byte_count:2]
+    bits = np.unpackbits(values[:, np.newaxis], axis=1)[:, 8 - bits_per_symbol:].reshape(-1)
+    return np.packbits(bits[:len(bits) // 8 * 8])
+
+def bytes_to_periods(data, profile):
+    """Splits bytes into a (num_periods x carriers) matrix of symbol values, zero-padding the last period."""
+    values = bytes_to_symbols(data, profile.bits_per_symbol)
+    if profile.carriers > 1:
+        values = np.append(values, np.zeros(-len(values) % profile.carriers, dtype=np.uint8))
+    return values.reshape(-1, profile.carriers)
+
+@functools.lru_cache(maxsize=8)
+def edge_window(samples_per_symbol, ramp):
+    """Per-symbol gain rising and falling as a raised cosine over the first and last ramp fraction of it."""
+    window = np.ones(samples_per_symbol, dtype=np.float32)
+    ramp_samples = int(ramp * samples_per_symbol)
+    if ramp_samples:
+        rise = 0.5 * (1 - np.cos(np.pi * (np.arange(ramp_samples) + 0.5) / ramp_samples))
+        window[:ramp_samples] = rise
+        window[-ramp_samples:] = rise[::-1]
+    return window
+
+def synthesize_periods(values, profile, out, phases=None, edge_ramp=0.):
+    """Writes the tones for a (num_periods x carriers) symbol matrix into the int16 rows of out.
+
+    Each carrier's tone row is looked up in the template table; sub-bands are summed in place. Passing
+    phases (one start phase per carrier, advanced in place) selects continuous-phase FSK: every symbol
+    starts at the phase where the previous one ended, built as sin(wt + p) = sin(wt) cos(p) + cos(wt) sin(p)
+    from the quadrature templates. edge_ramp tapers the first and last fraction of every symbol with a
+    raised cosine.
+    """
+    if phases is None and not edge_ramp:
+        np.take(profile.tone_templates, values[:, 0], axis=0, out=out)
+        for carrier in range(1, profile.carriers):
+            tone_rows = values[:, carrier].astype(np.intp) + carrier * profile.num_tones
+            out += np.take(profile.tone_templates, tone_rows, axis=0)
+        return out
+
+    signal = np.zeros(out.shape, dtype=np.float32)
+    for carrier in range(profile.carriers):
+        tone_rows = values[:, carrier].astype(np.intp) + carrier * profile.num_tones
+        if phases is None:
+            signal += profile.tone_templates[tone_rows]
+            continue
+        advances = profile.phase_advances[tone_rows]
+        starts = phases[carrier] + np.concatenate(([0.], np.cumsum(advances[:-1])))
+        if len(starts):
+            phases[carrier] = (starts[-1] + advances[-1]) % (2. * np.pi)
+        sines, cosines = profile.quadrature_templates
+        signal += sines[tone_rows] * np.cos(starts, dtype=np.float32)[:, np.newaxis]
+        signal += cosines[tone_rows] * np.sin(starts, dtype=np.float32)[:, np.newaxis]
+    if edge_ramp:
+        signal *= edge_window(profile.samples_per_symbol, edge_ramp)
+    return np.rint(signal, out=out, casting='unsafe')
+
+def build_gf_tables():
+    """Exponent, logarithm and full multiplication tables of GF(256)."""
+    exp = np.zeros(2 * RS_CODEWORD_SIZE, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.intp)
+    x = 1
+    for power in range(RS_CODEWORD_SIZE):
+        exp[power] = x
+        log[x] = power
+        x <<= 1
+        if x & 0x100:
+            x ^= 0x11D
+    exp[RS_CODEWORD_SIZE:] = exp[:RS_CODEWORD_SIZE]
+    mul = exp[log[:, np.newaxis] + log[np.newaxis, :]]
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+GF_EXP, GF_LOG, GF_MUL = build_gf_tables()
+# Plain-list copies for the scalar parts of decoding, where list indexing beats NumPy scalars
+GF_EXP_LIST, GF_LOG_LIST = GF_EXP.tolist(), GF_LOG.tolist()
+
+@functools.lru_cache(maxsize=8)
+def rs_parity_matrix(nsym):
+    """Parity contribution of each data position: row j is the parity of a codeword whose only nonzero
+    data byte is a 1 at position j.
+
+    Encoding is linear, so the parity of any codeword is the GF sum of its data bytes times their rows.
+    The generator polynomial is prod(x - 2**i) for i < nsym.
+    """
+    generator = [1]
+    for i in range(nsym):
+        generator = [a ^ int(GF_MUL[b, GF_EXP[i]]) for a, b in zip(generator + [0], [0] + generator)]
+    # x**nsym mod g(x), then one more power of x per row, highest-degree coefficient first
+    remainder = generator[1:]
+    rows = [remainder]
+    for _ in range(RS_CODEWORD_SIZE - nsym - 1):
+        lead = remainder[0]
+        remainder = [a ^ int(GF_MUL[lead, b]) for a, b in zip(remainder[1:] + [0], generator[1:])]
+        rows.append(remainder)
+    return np.array(rows[::-1], dtype=np.uint8)
+
+@functools.lru_cache(maxsize=8)
+def rs_syndrome_matrix(nsym):
+    """Powers 2**(i * (254 - p)): evaluating codeword position p at the roots 2**i of the generator."""
+    powers = (RS_CODEWORD_SIZE - 1 - np.arange(RS_CODEWORD_SIZE))[:, np.newaxis] * np.arange(nsym)
+    return GF_EXP[powers % RS_CODEWORD_SIZE]
+
+def gf_matmul(a, b):
+    """Product of uint8 matrices over GF(256), batched over the rows of a."""
+    out = np.empty((len(a), b.shape[1]), dtype=np.uint8)
+    for first in range(0, len(a), RS_BATCH_CODEWORDS):
+        rows = a[first:first + RS_BATCH_CODEWORDS]
+        out[first:first + RS_BATCH_CODEWORDS] = np.bitwise_xor.reduce(
+            GF_MUL[rows[:, :, np.newaxis], b[np.newaxis, :, :]], axis=1)
+    return out
+
+def rs_layout(data_length, nsym):
+    """Codeword matrix shape and the mask of its transmitted bytes for data_length data bytes.
+
+    Data fills rows of 255 - nsym bytes; the last codeword is shortened by left-padding it with zeros,
+    which are neither sent nor received.
+    """
+    data_per_codeword = RS_CODEWORD_SIZE - nsym
+    num_codewords = max(-(-data_length // data_per_codeword), 1)
+    mask = np.ones((num_codewords, RS_CODEWORD_SIZE), dtype=bool)
+    mask[-1, :num_codewords * data_per_codeword - data_length] = False
+    return mask
+
+def rs_coded_size(data_length, nsym):
+    return data_length + len(rs_layout(data_length, nsym)) * nsym
+
+def rs_encode(data, nsym):
+    """Appends nsym Reed-Solomon parity bytes to every codeword of data and interleaves the codewords
+    byte by byte, so a burst of symbol errors is spread over all of them."""
+    mask = rs_layout(len(data), nsym)
+    codewords = np.zeros(mask.shape, dtype=np.uint8)
+    data_part = codewords[:, :RS_CODEWORD_SIZE - nsym]
+    data_part[mask[:, :RS_CODEWORD_SIZE - nsym]] = np.frombuffer(data, dtype=np.uint8)
+    codewords[:, RS_CODEWORD_SIZE - nsym:] = gf_matmul(data_part, rs_parity_matrix(nsym))
+    return codewords.T[mask.T].tobytes()
+
+def gf_poly_eval(coefficients, x_logs):
+    """Evaluates a polynomial (lowest degree first) at the points 2**x_logs, vectorized over the points."""
+    degrees = np.arange(len(coefficients))
+    powers = GF_EXP[np.outer(x_logs, degrees) % RS_CODEWORD_SIZE]
+    terms = GF_MUL[np.asarray(coefficients, dtype=np.uint8)[np.newaxis, :], powers]
+    return np.bitwise_xor.reduce(terms, axis=1)
+
+def rs_correct_codeword(codeword, syndromes):
+    """Corrects one codeword in place from its syndromes (Berlekamp-Massey, Chien search, Forney).
+
+    Returns the number of corrected bytes, or -1 if there are more errors than the parity can fix.
+    """
+    exp, log = GF_EXP_LIST, GF_LOG_LIST
+    syndromes = syndromes.tolist()
+    nsym = len(syndromes)
+    # Berlekamp-Massey: error locator polynomial, lowest degree first
+    locator, previous = [1], [1]
+    errors, shift, previous_discrepancy = 0, 1, 1
+    for n in range(nsym):
+        discrepancy = syndromes[n]
+        for i in range(1, errors + 1):
+            if locator[i] and syndromes[n - i]:
+                discrepancy ^= exp[log[locator[i]] + log[syndromes[n - i]]]
+        if discrepancy == 0:
+            shift += 1
+            continue
+        scale_log = (log[discrepancy] - log[previous_discrepancy]) % RS_CODEWORD_SIZE
+        updated = locator + [0] * max(0, len(previous) + shift - len(locator))
+        for i, coefficient in enumerate(previous):
+            if coefficient:
+                updated[i + shift] ^= exp[scale_log + log[coefficient]]
+        if 2 * errors <= n:
+            previous, errors, previous_discrepancy, shift = locator, n + 1 - errors, discrepancy, 1
+        else:
+            shift += 1
+        locator = updated
+    locator = locator[:errors + 1]
+    if 2 * errors > nsym:
+        return -1
+
+    # Chien search: position p is in error where the locator vanishes at 2**-(254 - p)
+    powers = RS_CODEWORD_SIZE - 1 - np.arange(RS_CODEWORD_SIZE)
+    inverse_logs = -powers % RS_CODEWORD_SIZE
+    positions = np.flatnonzero(gf_poly_eval(locator, inverse_logs) == 0)
+    if len(positions) != errors:
+        return -1
+
+    # Forney: error values from the evaluator S(x) * locator(x) mod x**nsym and the locator's
+    # formal derivative (its odd-degree terms, one degree down)
+    evaluator = [0] * nsym
+    for degree, coefficient in enumerate(locator):
+        for i, syndrome in enumerate(syndromes[:nsym - degree]):
+            if coefficient and syndrome:
+                evaluator[degree + i] ^= exp[log[coefficient] + log[syndrome]]
+    derivative = [0 if degree % 2 else coefficient for degree, coefficient in enumerate(locator[1:])]
+    numerators = gf_poly_eval(evaluator, inverse_logs[positions])
+    denominators = gf_poly_eval(derivative, inverse_logs[positions])
+    if not denominators.all():
+        return -1
+    magnitude_logs = powers[positions] + GF_LOG[numerators] - GF_LOG[denominators]
+    magnitudes = np.where(numerators > 0, GF_EXP[magnitude_logs % RS_CODEWORD_SIZE], 0)
+    codeword[positions] ^= magnitudes.astype(np.uint8)
+    return errors
+
+def rs_decode(coded, data_length, nsym):
+    """Deinterleaves and corrects an rs_encode() output carrying data_length data bytes.
+
+    Syndromes of all codewords are computed at once; only codewords with errors are corrected one by
+    one. Returns (data, corrected bytes, uncorrectable codewords).
+    """
+    mask = rs_layout(data_length, nsym)
+    codewords = np.zeros(mask.shape, dtype=np.uint8)
+    received = np.frombuffer(coded, dtype=np.uint8)[:np.count_nonzero(mask)]
+    codewords.T[mask.T] = np.pad(received, (0, np.count_nonzero(mask) - len(received)))
+    syndromes = gf_matmul(codewords, rs_syndrome_matrix(nsym))
+    corrected = failed = 0
+    for row in np.flatnonzero(syndromes.any(axis=1)):
+        codeword = codewords[row].copy()
+        errors = rs_correct_codeword(codeword, syndromes[row])
+        # Shortened codewords must not be "corrected" in their virtual padding
+        if errors < 0 or not mask[row][codeword != codewords[row]].all():
+            failed += 1
+            continue
+        codewords[row] = codeword
+        corrected += errors
+    data_part = codewords[:, :RS_CODEWORD_SIZE - nsym][mask[:, :RS_CODEWORD_SIZE - nsym]]
+    return data_part.tobytes(), corrected, failed
+
+# Parsed framed-format header; the tone plan fields let the decoder reject a mismatched profile.
+FrameHeader = collections.namedtuple(
+    'FrameHeader', 'flags bits_per_symbol carriers fec_symbols samples_per_symbol tone_spacing '
+                   'base_frequency block_size payload_length')
+
+# One framed payload block: its index, the symbol period it starts at and its payload size in bytes.
+FrameBlock = collections.namedtuple('FrameBlock', 'index first_period size')
+
+# codec name -> (header id, compressor factory, decompressor factory)
+CODECS = {
+    'zlib': (1, lambda: zlib.compressobj(9), zlib.decompressobj),
+    'bz2': (2, lambda: bz2.BZ2Compressor(9), bz2.BZ2Decompressor),
+    'lzma': (3, lambda: lzma.LZMACompressor(preset=6), lzma.LZMADecompressor),
+}
+
+def codec_from_flags(flags):
+    """Name of the codec a frame header's flags select, or None if the payload is uncompressed."""
+    codec_id = (flags & FRAME_CODEC_MASK) >> FRAME_CODEC_SHIFT
+    return next((name for name, (other_id, _, _) in CODECS.items() if other_id == codec_id), None)
+
+def choose_codec(stream, data_size):
+    """Picks the codec that compresses samples of a seekable stream best, or 'none' if no codec pays off."""
+    if data_size <= COMPRESS_SAMPLE_CHUNKS * COMPRESS_CHUNK_SIZE:
+        sample = stream.read()
+    else:
+        sample = bytearray()
+        for chunk in range(COMPRESS_SAMPLE_CHUNKS):
+            stream.seek(data_size * chunk // COMPRESS_SAMPLE_CHUNKS)
+            sample += stream.read(COMPRESS_CHUNK_SIZE)
+    stream.seek(0)
+    if not sample:
+        return 'none'
+    sizes = {}
+    for name, (_, compressor, _) in CODECS.items():
+        codec = compressor()
+        sizes[name] = len(codec.compress(sample)) + len(codec.flush())
+    best = min(sizes, key=sizes.get)
+    return best if sizes[best] <= (1 - COMPRESS_MIN_SAVING) * len(sample) else 'none'
+
+def read_input(stream, size):
+    """Reads up to size bytes of the encoder's input, timed as the read stage and counted."""
+    with stage('read'):
+        data = stream.read(size)
+    count_processed('bytes', len(data))
+    return data
+
+def compress_stream(stream, codec):
+    """Compresses a binary stream chunk by chunk into a spooled temporary file, rewound for reading."""
+    import tempfile
+    compressor = CODECS[codec][1]()
+    spool = tempfile.SpooledTemporaryFile(COMPRESS_SPOOL_SIZE)
+    for chunk in iter(lambda: read_input(stream, COMPRESS_CHUNK_SIZE), b''):
+        with stage('compression'):
+            spool.write(compressor.compress(chunk))
+    with stage('compression'):
+        spool.write(compressor.flush())
+    spool.seek(0)
+    return spool
+
+def pack_frame_header(payload_length, block_size, profile=DEFAULT_PROFILE, fec_symbols=0, flags=0):
+    """Packs a framed-format header, followed by its own Reed-Solomon parity when the stream uses FEC."""
+    if fec_symbols:
+        flags |= FRAME_FLAG_FEC
+    header = struct.pack(FRAME_HEADER_FORMAT, FRAME_MAGIC, FRAME_VERSION, flags, profile.bits_per_symbol,
+                         profile.carriers, fec_symbols, profile.samples_per_symbol, profile.tone_spacing,
+                         profile.base_frequency, block_size, payload_length)
+    header += struct.pack('<I', zlib.crc32(header))
+    return rs_encode(header, FRAME_HEADER_FEC_SYMBOLS) if fec_symbols else header
+
+def unpack_frame_header(data):
+    """Parses a framed-format header, or returns None if data does not hold a valid one."""
+    if len(data) < FRAME_HEADER_SIZE:
+        return None
+    header, (crc,) = data[:FRAME_HEADER_SIZE - 4], struct.unpack('<I', data[FRAME_HEADER_SIZE - 4:FRAME_HEADER_SIZE])
+    magic, version, *fields = struct.unpack(FRAME_HEADER_FORMAT, header)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION or zlib.crc32(header) != crc:
+        return None
+    return FrameHeader(*fields)
+
+def frame_segment_size(data_length, fec_symbols=0):
+    """Transmitted size of a header or block of data_length bytes (CRC included)."""
+    return rs_coded_size(data_length, fec_symbols) if fec_symbols else data_length
+
+def frame_header_periods(profile=DEFAULT_PROFILE, fec_symbols=0):
+    """Symbol periods taken by the header of a framed stream, i.e. the period its first block starts at."""
+    header_fec = FRAME_HEADER_FEC_SYMBOLS if fec_symbols else 0
+    return profile.symbols_for_bytes(frame_segment_size(FRAME_HEADER_SIZE, header_fec))
+
+def frame_blocks(payload_length, block_size, profile=DEFAULT_PROFILE, fec_symbols=0):
+    """Lays out the payload blocks of a framed stream after its header."""
+    first_period = frame_header_periods(profile, fec_symbols)
+    for index, offset in enumerate(range(0, payload_length, block_size)):
+        size = min(block_size, payload_length - offset)
+        yield FrameBlock(index, first_period, size)
+        first_period += profile.symbols_for_bytes(frame_segment_size(size + FRAME_CRC_SIZE, fec_symbols))
+
+def header_blocks(header, profile=DEFAULT_PROFILE, total_periods=None):
+    """Lays out the blocks of the framed stream a header describes.
+
+    A streamed payload's blocks all hold block_size bytes plus their length prefix; as many are laid out
+    as fit in total_periods symbol periods, or endlessly if that is None.
+    """
+    if not header.flags & FRAME_FLAG_STREAMED:
+        return frame_blocks(header.payload_length, header.block_size, profile, header.fec_symbols)
+    size = header.block_size + FRAME_LENGTH_SIZE
+    first_period = frame_header_periods(profile, header.fec_symbols)
+    step = profile.symbols_for_bytes(frame_segment_size(size + FRAME_CRC_SIZE, header.fec_symbols))
+    indices = itertools.count() if total_periods is None else range(max(total_periods - first_period, 0) // step)
+    return (FrameBlock(index, first_period + index * step, size) for index in indices)
+
+def split_streamed_block(payload, block_size):
+    """Splits a decoded block of a streamed payload into its payload bytes and whether it is the last."""
+    (length,) = struct.unpack('<I', payload[:FRAME_LENGTH_SIZE])
+    length = min(length, block_size)
+    return payload[FRAME_LENGTH_SIZE:FRAME_LENGTH_SIZE + length], length < block_size
+
+def iter_payload_blocks(stream, block_size, codec=None):
+    """Reads a binary stream as payload blocks of block_size bytes (the last one shorter), compressing
+    it on the fly with codec if one is named."""
+    if codec is None:
+        yield from iter(lambda: read_input(stream, block_size), b'')
         return
+    compressor = CODECS[codec][1]()
+    pending = bytearray()
+    for chunk in itertools.chain(iter(lambda: read_input(stream, COMPRESS_CHUNK_SIZE), b''), [None]):
+        with stage('compression'):
+            pending += compressor.flush() if chunk is None else compressor.compress(chunk)
+        whole = len(pending) - len(pending) % block_size
+        for first in range(0, whole, block_size):
+            yield bytes(pending[first:first + block_size])
+        del pending[:whole]
+    if pending:
+        yield bytes(pending)
+
+def iter_streamed_blocks(blocks, block_size):
+    """Gives the blocks of a streamed payload their length prefix and padding, adding an empty block to
+    end the payload if the last one is full."""
+    last_size = block_size
+    for block in blocks:
+        last_size = len(block)
+        yield b''.join((struct.pack('<I', last_size), block, bytes(block_size - last_size)))
+    if last_size == block_size:
+        yield bytes(FRAME_LENGTH_SIZE + block_size)
+
+def iter_frame_segments(blocks, payload_length, block_size, profile=DEFAULT_PROFILE, fec_symbols=0, flags=0):
+    """Yields the framed form of a sequence of payload blocks: the header, then every block with its CRC32
+    appended and, with fec_symbols, Reed-Solomon encoded. A payload_length of None frames the blocks as
+    a streamed payload."""
+    if payload_length is None:
+        blocks = iter_streamed_blocks(blocks, block_size)
+        flags |= FRAME_FLAG_STREAMED
+    yield pack_frame_header(payload_length or 0, block_size, profile, fec_symbols, flags)
+    for block in blocks:
+        with stage('framing'):
+            block = b''.join((block, struct.pack('<I', zlib.crc32(block))))
+            if fec_symbols:
+                block = rs_encode(block, fec_symbols)
+        yield block
+
+def iter_prefetched(iterable, depth=STDIO_PREFETCH_SEGMENTS):
+    """Runs an iterable in a background thread up to depth items ahead of the consumer, so reading a pipe
+    overlaps with processing what has already arrived. Exceptions are re-raised in the consumer."""
+    import queue
+    items = queue.Queue(depth)
+    end = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+            items.put((end, None))
+        except BaseException as e:
+            items.put((end, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item, error = items.get()
+        if error is not None:
+            raise error
+        if item is end:
+            return
+        yield item
+
+def iter_period_chunks(segments, profile, chunk_periods):
+    """Converts byte segments to symbol periods, each segment padded to whole periods, and regroups
+    them into chunks of chunk_periods (the last one may be shorter)."""
+    pending = None
+    for segment in segments:
+        with stage('bit-packing'):
+            values = bytes_to_periods(segment, profile)
+            if pending is not None:
+                values = np.concatenate((pending, values))
+        whole = len(values) - len(values) % chunk_periods
+        for first in range(0, whole, chunk_periods):
+            yield values[first:first + chunk_periods]
+        pending = values[whole:] if whole < len(values) else None
+    if pending is not None:
+        yield pending
+
+@functools.lru_cache(maxsize=4)
+def preamble_profile(sample_rate):
+    """The legacy tone plan at sample_rate, used for the sync header and preamble of self-describing streams."""
+    return dataclasses.replace(DEFAULT_PROFILE, sample_rate=sample_rate)
+
+def pack_preamble(profile, flags=0, fec_symbols=0):
+    """Packs the preamble describing profile, Reed-Solomon protected."""
+    preamble = struct.pack(PREAMBLE_FORMAT, PREAMBLE_MAGIC, PREAMBLE_VERSION, profile.sample_rate,
+                           profile.symbol_duration, profile.bits_per_symbol, profile.carriers, profile.tone_spacing,
+                           profile.base_frequency, flags, fec_symbols)
+    preamble += struct.pack('<I', zlib.crc32(preamble))
+    return rs_encode(preamble, PREAMBLE_FEC_SYMBOLS)
+
+def unpack_preamble(data):
+    """Corrects and parses a preamble; returns (profile, flags, fec_symbols) or None if data holds none."""
+    data = rs_decode(data, PREAMBLE_SIZE, PREAMBLE_FEC_SYMBOLS)[0]
+    preamble, (crc,) = data[:PREAMBLE_SIZE - 4], struct.unpack('<I', data[PREAMBLE_SIZE - 4:])
+    magic, version, sample_rate, symbol_duration, bits, carriers, spacing, base, flags, fec_symbols = \
+        struct.unpack(PREAMBLE_FORMAT, preamble)
+    if magic != PREAMBLE_MAGIC or version != PREAMBLE_VERSION or zlib.crc32(preamble) != crc:
+        return None
+    try:
+        profile = ModemProfile(bits_per_symbol=bits, symbol_duration=symbol_duration, tone_spacing=spacing,
+                               base_frequency=base, sample_rate=sample_rate, carriers=carriers)
+    except ValueError:
+        return None
+    return profile, flags, fec_symbols
+
+def preamble_samples(sample_rate):
+    """Length of a preamble in samples."""
+    described = preamble_profile(sample_rate)
+    coded_size = rs_coded_size(PREAMBLE_SIZE, PREAMBLE_FEC_SYMBOLS)
+    return described.symbols_for_bytes(coded_size) * described.samples_per_symbol
+
+def iter_signal_blocks(segments, profile=DEFAULT_PROFILE, block_symbols=ENCODE_BLOCK_SYMBOLS, lanes=1, preamble=None,
+                       synthesis='reset', edge_ramp=0.):
+    """Yields the MFSK signal for a sequence of byte segments as int16 blocks: the sync header, then
+    one block per block_symbols symbol periods. Every segment starts on a symbol period boundary. Blocks
+    share one reusable buffer, so consume each before requesting the next.
+
+    With lanes > 1 the blocks are (frames x lanes) and symbol periods are dealt round-robin to the
+    channels, each of which starts with its own sync header. A lane that runs out one period early is
+    padded with silence. A preamble (from pack_preamble) makes the stream self-describing: the sync
+    header and preamble then use the legacy tone plan, whatever the data's. synthesis='cpfsk' keeps every
+    lane's phase continuous across symbols and blocks; edge_ramp is passed to synthesize_periods.
+    """
+    if preamble is None:
+        intro = profile.sync_tone
+    else:
+        described = preamble_profile(profile.sample_rate)
+        preamble_values = bytes_to_periods(preamble, described)
+        preamble_rows = np.empty((len(preamble_values), described.samples_per_symbol), dtype=np.int16)
+        intro = np.concatenate((described.sync_tone,
+                                synthesize_periods(preamble_values, described, preamble_rows).reshape(-1)))
+    if lanes == 1:
+        yield intro
+    else:
+        yield np.repeat(intro[:, np.newaxis], lanes, axis=1)
+    symbol_rows = np.empty((block_symbols, profile.samples_per_symbol), dtype=np.int16)
+    lane_frames = np.empty((block_symbols * profile.samples_per_symbol, lanes), dtype=np.int16)
+    phases = np.zeros((lanes, profile.carriers)) if synthesis == 'cpfsk' else [None] * lanes
+    for values in iter_period_chunks(segments, profile, block_symbols * lanes):
+        count_processed('symbols', len(values))
+        if lanes == 1:
+            with stage('synthesis'):
+                block = synthesize_periods(values, profile, symbol_rows[:len(values)], phases[0], edge_ramp)
+            yield block.reshape(-1)
+            continue
+        block = lane_frames[:-(-len(values) // lanes) * profile.samples_per_symbol]
+        with stage('synthesis'):
+            for lane in range(lanes):
+                lane_values = values[lane::lanes]
+                lane_signal = synthesize_periods(lane_values, profile, symbol_rows[:len(lane_values)], phases[lane],
+                                                 edge_ramp).reshape(-1)
+                block[:len(lane_signal), lane] = lane_signal
+                block[len(lane_signal):, lane] = 0
+        yield block
+
+def modulate_bytes(data, profile=DEFAULT_PROFILE, synthesis='reset', edge_ramp=0.):
+    """Returns the whole unframed MFSK signal (sync header included) for data as one int16 array."""
+    block_bytes = ENCODE_BLOCK_SYMBOLS * profile.bits_per_period // 8
+    segments = (data[first:first + block_bytes] for first in range(0, len(data), block_bytes))
+    blocks = iter_signal_blocks(segments, profile, synthesis=synthesis, edge_ramp=edge_ramp)
+    return np.concatenate([block.copy() for block in blocks])
+
+class WavWriter:
+    """Writes 16-bit PCM WAV incrementally, patching the RIFF sizes on close when the file is seekable.
+
+    expected_frames (if known) sizes the header up front and selects RF64 for data beyond 4 GiB, so the
+    output matches scipy.io.wavfile.write for the same samples. None leaves the sizes at 0xFFFFFFFF, the
+    customary mark of a length unknown when the header went out, for output to a pipe.
+    """
+
+    def __init__(self, fileobj, sample_rate, channels=1, expected_frames=0):
+        self.fileobj = fileobj
+        self.block_align = 2 * channels
+        self.data_bytes = 0
+        data_size = 0xFFFFFFFF if expected_frames is None else expected_frames * self.block_align
+        fmt_chunk = struct.pack('<HHIIHH', 1, channels, sample_rate, sample_rate * self.block_align,
+                                self.block_align, 16)
+        self.is_rf64 = expected_frames is not None and 4 + 24 + 8 + data_size > 0xFFFFFFFF
+        if self.is_rf64:
+            header = (b'RF64' + b'\xFF\xFF\xFF\xFF' + b'WAVE' + b'ds64' + struct.pack('<I', 28)
+                      + struct.pack('<QQQI', 0, data_size, expected_frames, 0))
+        else:
+            header = b'RIFF' + struct.pack('<I', min(4 + 24 + 8 + data_size, 0xFFFFFFFF)) + b'WAVE'
+        header += b'fmt ' + struct.pack('<I', len(fmt_chunk)) + fmt_chunk
+        header += b'data' + struct.pack('<I', min(data_size, 0xFFFFFFFF))
+        self.header_size = len(header)
+        fileobj.write(header)
+
+    def write(self, samples):
+        data = np.ascontiguousarray(samples, dtype='<i2')
+        self.fileobj.write(data.data)
+        self.data_bytes += data.nbytes
+
+    def close(self):
+        """Rewrites the size fields with the amount of audio actually written."""
+        if not self.fileobj.seekable():
+            return
+        end = self.fileobj.tell()
+        riff_size = self.header_size - 8 + self.data_bytes
+        if self.is_rf64:
+            self.fileobj.seek(20)
+            self.fileobj.write(struct.pack('<QQQ', riff_size, self.data_bytes, self.data_bytes // self.block_align))
+        else:
+            self.fileobj.seek(4)
+            self.fileobj.write(struct.pack('<I', min(riff_size, 0xFFFFFFFF)))
+            self.fileobj.seek(self.header_size - 4)
+            self.fileobj.write(struct.pack('<I', min(self.data_bytes, 0xFFFFFFFF)))
+        self.fileobj.seek(end)
+
+class BufferReader:
+    """Read-only file interface over a bytes-like object. read() hands out memoryview slices, so an
+    in-memory payload is streamed through the encoder without being copied."""
+
+    def __init__(self, data):
+        self.view = memoryview(data).cast('B')
+        self.position = 0
+
+    def __len__(self):
+        return len(self.view)
 
-    # Convert data to a stream of 4-bit nibbles (values 0-15)
-    unpacked_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
-    # Pad with zeros if not a multiple of 4
-    if len(unpacked_bits) % 4 != 0:
-        padding = 4 - (len(unpacked_bits) % 4)
-        unpacked_bits = np.append(unpacked_bits, np.zeros(padding, dtype=np.uint8))
-    
-    # Reshape into 4-bit chunks and convert to integers
-    nibbles = unpacked_bits.reshape(-1, 4)
-    # Pack 4 bits into an integer value (0-15)
-    values = (nibbles[:, 0] * 8 + nibbles[:, 1] * 4 + nibbles[:, 2] * 2 + nibbles[:, 3])
-    
-    print(f"Successfully read {len(data)} bytes ({len(values)} symbols).")
-
-    print("Generating MFSK audio signal...")
-    sync_header_tone = generate_tone(SYNC_HEADER_FREQ, SYNC_HEADER_DURATION, SAMPLE_RATE, AMPLITUDE)
-    
-    signal_chunks = [sync_header_tone]
-    for value in values:
-        freq = FREQUENCIES[value]
-        tone = generate_tone(freq, SYMBOL_DURATION, SAMPLE_RATE, AMPLITUDE)
-        signal_chunks.append(tone)
-
-    full_signal = np.concatenate(signal_chunks)
-
-    print(f"Writing audio to '{output_path}'...")
-    wavfile.write(output_path, SAMPLE_RATE, full_signal)
-    print(f"Encoding complete! Audio duration: {len(full_signal)/SAMPLE_RATE:.2f} seconds.")
+    def read(self, size=-1):
+        stop = len(self.view) if size is None or size < 0 else self.position + size
+        chunk = self.view[self.position:stop]
+        self.position += len(chunk)
+        return chunk
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.position, os.SEEK_END: len(self.view)}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def close(self):
+        pass
+
+# What the encoder will send: the (possibly compressed) stream, its size, its byte segments, the symbol
+# periods they fill, the WAV frames of the whole signal and the preamble (None without one). The sizes
+# and counts are None for a stream whose length is unknown.
+EncodePlan = collections.namedtuple('EncodePlan', 'stream data_size segments num_symbols total_frames preamble')
+
+def plan_encoding(stream, data_size, profile=DEFAULT_PROFILE, channels=1, framed=False,
+                  block_size=FRAME_BLOCK_SIZE, fec_symbols=0, compression='none', describe=False, verbose=False):
+    """Lays out the signal for data_size bytes of a binary stream; see encode for the options.
+
+    Compression, if any, happens here, and plan.stream is then a spooled temporary file to close once
+    the segments have been consumed. A data_size of None stands for a stream of unknown length, such as
+    a pipe: it is read only as the segments are consumed, compressed on the fly and, when framed, sent
+    as a streamed payload. Raises ValueError for invalid options.
+    """
+    if channels < 1:
+        raise ValueError(f"channels must be at least 1, got {channels}.")
+    if not 0 < block_size <= 0xFFFFFFFF:
+        raise ValueError("block_size must be a positive 32-bit byte count.")
+    if not 0 <= fec_symbols <= RS_MAX_PARITY:
+        raise ValueError(f"fec_symbols must be between 0 and {RS_MAX_PARITY}.")
+    if compression not in CODECS and compression not in ('none', 'auto'):
+        raise ValueError(f"Unknown compression '{compression}'.")
+    framed = framed or fec_symbols > 0 or compression != 'none'
+    if compression == 'auto':
+        if data_size is None:
+            raise ValueError("Automatic compression needs an input of known size; name a codec instead.")
+        with stage('compression'):
+            compression = choose_codec(stream, data_size)
+        if verbose:
+            print(f"Auto-selected compression: {compression}")
+    flags = 0
+    codec = None
+    if compression != 'none' and data_size is None:
+        codec = compression
+        flags = CODECS[compression][0] << FRAME_CODEC_SHIFT
+        if verbose:
+            print(f"Compressing with {compression} as the input is read.")
+    elif compression != 'none':
+        input_size = data_size
+        stream = compress_stream(stream, compression)
+        data_size = stream.seek(0, os.SEEK_END)
+        stream.seek(0)
+        flags = CODECS[compression][0] << FRAME_CODEC_SHIFT
+        if verbose:
+            print(f"Compressed {input_size} bytes to {data_size} with {compression}.")
+    if framed:
+        if compression != 'none' and codec is None:
+            blocks = iter(lambda: stream.read(block_size), b'') # The spool, its input already read and counted
+        else:
+            blocks = iter_payload_blocks(stream, block_size, codec)
+        segments = iter_frame_segments(blocks, data_size, block_size, profile, fec_symbols, flags)
+        num_symbols = None if data_size is None else frame_header_periods(profile, fec_symbols) + sum(
+            profile.symbols_for_bytes(frame_segment_size(block.size + FRAME_CRC_SIZE, fec_symbols))
+            for block in frame_blocks(data_size, block_size, profile, fec_symbols))
+    else:
+        block_bytes = ENCODE_BLOCK_SYMBOLS * channels * profile.bits_per_period // 8
+        segments = iter(lambda: read_input(stream, block_bytes), b'')
+        num_symbols = None if data_size is None else profile.symbols_for_bytes(data_size)
+    preamble = None
+    intro_frames = len(profile.sync_tone)
+    if describe:
+        preamble = pack_preamble(profile, flags | (PREAMBLE_FLAG_FRAMED if framed else 0), fec_symbols)
+        intro_frames = len(preamble_profile(profile.sample_rate).sync_tone) + preamble_samples(profile.sample_rate)
+    total_frames = None
+    if num_symbols is not None:
+        total_frames = intro_frames + -(-num_symbols // channels) * profile.samples_per_symbol
+    return EncodePlan(stream, data_size, segments, num_symbols, total_frames, preamble)
+
+def encode_bytes(data, profile=DEFAULT_PROFILE, channels=1, framed=False, block_size=FRAME_BLOCK_SIZE,
+                 fec_symbols=0, compression='none', describe=False, synthesis='reset', edge_ramp=0.):
+    """Encodes a bytes-like object into MFSK audio, without touching the disk or printing.
+
+    Takes the options of encode and returns the int16 signal at profile.sample_rate: a 1-D array, or
+    (frames x channels) with channels > 1. The payload is read through memoryview slices, and the signal
+    is synthesized block by block straight into the returned array.
+    """
+    plan = plan_encoding(BufferReader(data), len(memoryview(data).cast('B')), profile, channels, framed,
+                         block_size, fec_symbols, compression, describe)
+    signal = np.empty((plan.total_frames, channels) if channels > 1 else plan.total_frames, dtype=np.int16)
+    position = 0
+    for block in iter_signal_blocks(plan.segments, profile, lanes=channels, preamble=plan.preamble,
+                                    synthesis=synthesis, edge_ramp=edge_ramp):
+        signal[position:position + len(block)] = block
+        position += len(block)
+    plan.stream.close()
+    return signal[:position]
+
+def parse_fmt_chunk(fmt):
+    """Returns (sample_rate, channels) from a WAV fmt chunk, with channels None unless it describes
+    16-bit PCM. Raises ValueError if there is no valid fmt chunk."""
+    if fmt is None or len(fmt) < 16:
+        raise ValueError("WAV file has no valid fmt chunk before its data.")
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+    if format_tag != WAVE_FORMAT_PCM or bits != 16 or not channels or block_align != 2 * channels:
+        return sample_rate, None
+    return sample_rate, channels
+
+def read_wav(path, memory_map=False):
+    """Reads a WAV file as (sample_rate, samples), like scipy.io.wavfile.read.
+
+    16-bit PCM in RIFF or RF64 files, the only format the encoder writes, is parsed here with struct and
+    loaded with np.fromfile, or mapped with np.memmap when memory_map is set. Samples are 1-D for mono
+    and (frames x channels) otherwise. A data chunk running past the end of the file, as in a recording
+    cut short, is read up to the last whole frame. Other formats fall back to scipy, which is only
+    imported then. Raises ValueError if the file is not a WAV file.
+    """
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] not in (b'RIFF', b'RF64') or riff[8:] != b'WAVE':
+            if riff[:4] == b'RIFX':
+                return _read_wav_scipy(path, memory_map)
+            raise ValueError("File format not understood: not a RIFF/RF64 WAVE file.")
+        fmt = None
+        data_size_64 = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError("WAV file has no data chunk.")
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'data':
+                break
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+            elif chunk_id == b'ds64':
+                data_size_64 = struct.unpack('<QQ', f.read(chunk_size)[:16])[1]
+            else:
+                f.seek(chunk_size, os.SEEK_CUR)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)
+        sample_rate, channels = parse_fmt_chunk(fmt)
+        if channels is None:
+            return _read_wav_scipy(path, memory_map)
+        block_align = 2 * channels
+        data_offset = f.tell()
+        if chunk_size == 0xFFFFFFFF and data_size_64 is not None:
+            chunk_size = data_size_64
+        num_frames = min(chunk_size, os.fstat(f.fileno()).st_size - data_offset) // block_align
+        shape = (num_frames,) if channels == 1 else (num_frames, channels)
+        if memory_map and num_frames:
+            return sample_rate, np.memmap(path, dtype='<i2', mode='r', offset=data_offset, shape=shape)
+        return sample_rate, np.fromfile(f, dtype='<i2', count=num_frames * channels).reshape(shape)
+
+def _read_wav_scipy(path, memory_map=False):
+    """Reads a WAV format read_wav does not handle itself with scipy.io.wavfile."""
+    import scipy.io.wavfile
+    return scipy.io.wavfile.read(path, mmap=memory_map)
+
+def open_path(path, mode):
+    """Opens a file in binary mode, with STDIO_PATH standing for stdin or stdout, which closing the
+    returned file object leaves open."""
+    if path == STDIO_PATH:
+        return open(0 if 'r' in mode else 1, mode, closefd=False)
+    return open(path, mode)
+
+def known_size(fileobj):
+    """Size of an open regular file, or None for a pipe, FIFO or socket whose length is not known."""
+    info = os.fstat(fileobj.fileno())
+    return info.st_size if stat.S_ISREG(info.st_mode) else None
+
+def progress_output(output_path):
+    """Context sending progress messages to stderr while output_path has stdout carry the data."""
+    return contextlib.redirect_stdout(sys.stderr) if output_path == STDIO_PATH else contextlib.nullcontext()
+
+def encode_file(input_path, output_path, profile=DEFAULT_PROFILE, channels=1, framed=False,
+                block_size=FRAME_BLOCK_SIZE, fec_symbols=0, compression='none', describe=False,
+                synthesis='reset', edge_ramp=0., verbose=False):
+    """Streams a file into an MFSK WAV file, as encode does, and returns the audio duration in seconds.
+
+    Either path may be STDIO_PATH. Input of unknown length, from a pipe, is read ahead in a background
+    thread. Prints progress only when verbose. Raises OSError if a file cannot be opened.
+    """
+    with open_path(input_path, 'rb') as f:
+        plan = plan_encoding(f, known_size(f), profile, channels, framed, block_size, fec_symbols, compression,
+                             describe, verbose)
+        segments = plan.segments
+        if plan.data_size is None:
+            segments = iter_prefetched(segments)
+            if verbose:
+                print(f"Streaming input of unknown length as MFSK audio to '{output_path}'...")
+        elif verbose:
+            print(f"Streaming {plan.data_size} bytes ({plan.num_symbols} symbols) as MFSK audio to '{output_path}'...")
+        with open_path(output_path, 'wb') as out:
+            writer = WavWriter(out, profile.sample_rate, channels, expected_frames=plan.total_frames)
+            for block in iter_signal_blocks(segments, profile, lanes=channels, preamble=plan.preamble,
+                                            synthesis=synthesis, edge_ramp=edge_ramp):
+                with stage('write'):
+                    writer.write(block)
+            writer.close()
+        plan.stream.close()
+    return writer.data_bytes / writer.block_align / profile.sample_rate
+
+def encode(input_path, output_path, profile=DEFAULT_PROFILE, channels=1, framed=False,
+           block_size=FRAME_BLOCK_SIZE, fec_symbols=0, compression='none', describe=False,
+           synthesis='reset', edge_ramp=0.):
+    """Encodes a file into a high-density MFSK WAV audio file.
+
+    The input is read ENCODE_BLOCK_SYMBOLS symbols' worth at a time and each block's audio is appended to
+    the open WAV file, so peak memory does not depend on the input size. With channels > 1 every WAV
+    channel is an independent lane carrying every channels-th symbol period. framed selects the framed
+    format: a length header, then block_size-byte blocks each protected by a CRC32 and, with
+    fec_symbols, by that many Reed-Solomon parity bytes per 255-byte codeword. compression names a
+    codec from CODECS, or 'auto' to pick one from samples of the input; it implies the framed format,
+    whose header tells the decoder how to decompress. describe adds a preamble announcing the tone plan
+    and these settings, so the decoder needs no options. synthesis and edge_ramp shape the data symbols
+    as in iter_signal_blocks; the decoder needs neither, as its detectors ignore phase.
+
+    Either path may be '-' for stdin or stdout, so the encoder can sit in a pipeline; progress then goes
+    to stderr. Input from a pipe is encoded as it arrives, and with framing as a streamed payload since
+    its length is unknown; the WAV header then leaves the length open.
+    """
+    with progress_output(output_path):
+        print(f"Reading data from '{input_path}'...")
+        try:
+            duration = encode_file(input_path, output_path, profile, channels, framed, block_size, fec_symbols,
+                                   compression, describe, synthesis, edge_ramp, verbose=True)
+        except FileNotFoundError as e:
+            if e.filename != input_path:
+                raise
+            print(f"Error: Input file not found at '{input_path}'")
+            return
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        print(f"Encoding complete! Audio duration: {duration:.2f} seconds.")
+
+def interpolate_peaks(spectrum, peaks):
+    """Refines the peak bin of every row of a complex spectrum to a fractional bin.
+
+    Jacobsen's estimator fits the peak and its two neighbours, which for an unwindowed, unpadded window
+    is accurate to a small fraction of a bin; peaks on the first or last bin are kept.
+    """
+    rows = np.arange(len(spectrum))
+    inner = np.clip(peaks, 1, spectrum.shape[1] - 2)
+    below, centre, above = (spectrum[rows, inner + shift] for shift in (-1, 0, 1))
+    denominator = 2 * centre - below - above
+    denominator[denominator == 0] = 1
+    offsets = np.clip(np.real((below - above) / denominator), -0.5, 0.5)
+    return np.where(inner == peaks, peaks + offsets, peaks)
 
 def find_dominant_frequency(samples, sample_rate):
-    """Finds the dominant frequency in a chunk of audio samples using FFT."""
+    """Finds the dominant frequency in a chunk of audio samples using FFT, interpolated between bins."""
     N = len(samples)
     if N == 0: return 0
-    yf = np.fft.fft(samples)
-    xf = np.fft.fftfreq(N, 1 / sample_rate)
-    idx = np.argmax(np.abs(yf[0:N//2]))
-    return xf[idx]
-
-def decode(input_path, output_path):
-    """Decodes a high-density MFSK WAV audio file back into a file."""
-    print(f"Reading audio from '{input_path}'...")
-    try:
-        rate, audio_data = wavfile.read(input_path)
-    except FileNotFoundError:
-        print(f"Error: Input WAV file not found at '{input_path}'")
+    yf = np.fft.rfft(samples)[:max(N // 2, 1)]
+    idx = int(np.argmax(np.abs(yf)))
+    return float(interpolate_peaks(yf[np.newaxis], np.array([idx]))[0]) * sample_rate / N
+
+@functools.lru_cache(maxsize=4)
+def sync_carrier(num_samples, sample_rate, frequency):
+    """Complex reference oscillator at the sync frequency, cached across search blocks."""
+    return np.exp(-2j * np.pi * frequency / sample_rate * np.arange(num_samples))
+
+@functools.lru_cache(maxsize=4)
+def sync_reference(num_samples, sample_rate, frequency):
+    """The sync tone as the encoder starts it (phase zero), for sample-exact alignment."""
+    return np.sin(2. * np.pi * frequency / sample_rate * np.arange(num_samples))
+
+def sync_window_sums(samples, sample_rate, profile=DEFAULT_PROFILE):
+    """Correlates every sync-length window of samples with the sync tone.
+
+    Returns the correlation magnitude and a 0..1 score (the fraction of each window's energy that is
+    coherent sync tone) for the windows starting at samples 0, 1, 2, ...
+    """
+    window = profile.samples_per_sync_header
+    # Sized to the block searched, rounded up to a power of two so varying live chunks share the cache
+    length = min(1 << max(len(samples) - 1, 0).bit_length(), SYNC_SEARCH_BLOCK + window)
+    carrier = sync_carrier(max(length, len(samples)), sample_rate, profile.sync_frequency)
+    mixed = samples * carrier[:len(samples)]
+    # Sliding sums over one header length via cumulative sums: O(1) per window
+    mixed_sums = np.cumsum(np.concatenate(([0.], mixed)))
+    energy_sums = np.cumsum(np.concatenate(([0.], samples.astype(np.float64) ** 2)))
+    correlation = np.abs(mixed_sums[window:] - mixed_sums[:-window])
+    energy = energy_sums[window:] - energy_sums[:-window]
+    score = 2 * correlation ** 2 / (window * np.maximum(energy, 1e-9))
+    return correlation, score
+
+def downmix(samples):
+    """Averages multi-channel frames to mono in float32; mono input is returned untouched."""
+    if samples.ndim > 1:
+        return samples.mean(axis=1, dtype=np.float32)
+    return samples
+
+def find_sync_hit(audio_data, sample_rate, profile=DEFAULT_PROFILE):
+    """Returns the first sample whose sync-length window is at least SYNC_MIN_SCORE sync tone, or -1.
+
+    A matched filter against the sync tone is slid over the audio one block at a time.
+    """
+    chunk_size = profile.samples_per_sync_header
+    for block_start in range(0, len(audio_data) - chunk_size + 1, SYNC_SEARCH_BLOCK):
+        block = downmix(audio_data[block_start:block_start + SYNC_SEARCH_BLOCK + chunk_size - 1])
+        _, score = sync_window_sums(block, sample_rate, profile)
+        hits = np.flatnonzero(score >= SYNC_MIN_SCORE)
+        if len(hits):
+            return block_start + int(hits[0])
+    return -1
+
+def sync_refine_lags(profile=DEFAULT_PROFILE):
+    """Lags either side of the correlation peak that find_sync_end checks against the sync tone's phase."""
+    return max(int(SYNC_REFINE_PERIODS * profile.sample_rate / profile.sync_frequency), SYNC_REFINE_SAMPLES)
+
+def sync_refine_samples(profile=DEFAULT_PROFILE):
+    """Audio find_sync_end needs from a sync hit onwards."""
+    return 2 * profile.samples_per_sync_header + sync_refine_lags(profile)
+
+def find_sync_end(audio_data, first_hit, sample_rate, profile=DEFAULT_PROFILE):
+    """Locates the end of the sync header found by find_sync_hit at first_hit.
+
+    The correlation peak within the following header length locates the header. That envelope is nearly
+    flat at its peak, and the data after the header can hold it up for several samples, so the phase of
+    the known sync tone, checked over a few of its periods around the peak, pins down the exact sample.
+    """
+    chunk_size = profile.samples_per_sync_header
+    reach = sync_refine_lags(profile)
+    region = downmix(audio_data[first_hit:first_hit + sync_refine_samples(profile)])
+    correlation, _ = sync_window_sums(region[:2 * chunk_size - 1], sample_rate, profile)
+    peak = int(np.argmax(correlation))
+    lag_start = max(peak - reach, 0)
+    segment = region[lag_start:peak + reach + chunk_size]
+    reference = sync_reference(chunk_size, sample_rate, profile.sync_frequency)
+    peak = lag_start + int(np.argmax(np.correlate(segment, reference, 'valid')))
+    return first_hit + peak + chunk_size
+
+def find_sync(audio_data, sample_rate, profile=DEFAULT_PROFILE):
+    """Finds the sample index where data starts, just after the sync header, or -1 if absent."""
+    first_hit = find_sync_hit(audio_data, sample_rate, profile)
+    if first_hit < 0:
+        return -1
+    return find_sync_end(audio_data, first_hit, sample_rate, profile)
+
+def symbol_matrix(data_audio, samples_per_symbol):
+    """Views every whole symbol in data_audio as a (num_symbols x samples_per_symbol) strided matrix.
+    Windows already gathered into such a matrix are returned as they are."""
+    if data_audio.ndim == 2:
+        return data_audio
+    num_symbols = len(data_audio) // samples_per_symbol
+    windows = np.lib.stride_tricks.sliding_window_view(data_audio, samples_per_symbol)
+    return windows[::samples_per_symbol][:num_symbols]
+
+@functools.lru_cache(maxsize=8)
+def bin_to_tone_map(profile, sample_rate):
+    """Maps every positive-frequency FFT bin of a symbol window to its nearest MFSK tone.
+
+    Returns the tone index within its carrier for each bin, plus the [start, stop) bin range of every
+    carrier's sub-band (bins nearest to one of its tones; a single carrier owns the whole spectrum).
+    """
+    num_samples = profile.samples_per_symbol
+    bin_freqs = np.fft.rfftfreq(num_samples, 1 / sample_rate)[:num_samples // 2]
+    freq_errors = np.abs(bin_freqs[:, np.newaxis] - profile.frequencies[np.newaxis, :])
+    nearest = np.argmin(freq_errors, axis=1)
+    band_edges = np.searchsorted(nearest // profile.num_tones, np.arange(profile.carriers + 1))
+    return (nearest % profile.num_tones).astype(np.uint8), list(zip(band_edges[:-1], band_edges[1:]))
+
+def demodulate_fft(data_audio, sample_rate, profile=DEFAULT_PROFILE):
+    """Demodulates every whole symbol period in data_audio, one real FFT per batch of symbol rows.
+
+    Returns a (num_periods x carriers) matrix holding the strongest tone of each sub-band.
+    """
+    symbols = symbol_matrix(data_audio, profile.samples_per_symbol)
+    tone_of_bin, bands = bin_to_tone_map(profile, sample_rate)
+    values = np.empty((len(symbols), profile.carriers), dtype=np.uint8)
+    for i in range(0, len(symbols), DEMOD_BATCH_SYMBOLS):
+        spectrum = np.abs(np.fft.rfft(symbols[i:i + DEMOD_BATCH_SYMBOLS], axis=1)[:, :len(tone_of_bin)])
+        for carrier, (band_start, band_stop) in enumerate(bands):
+            peak_bins = band_start + np.argmax(spectrum[:, band_start:band_stop], axis=1)
+            values[i:i + DEMOD_BATCH_SYMBOLS, carrier] = tone_of_bin[peak_bins]
+    return values
+
+@functools.lru_cache(maxsize=8)
+def tone_correlation_basis(profile, sample_rate):
+    """Builds the (samples_per_symbol x 2*all_tones) matrix of cos|sin references for the MFSK tones."""
+    t = np.arange(profile.samples_per_symbol) / sample_rate
+    phase = 2. * np.pi * t[:, np.newaxis] * profile.frequencies[np.newaxis, :]
+    return np.hstack([np.cos(phase), np.sin(phase)])
+
+def demodulate_correlator(data_audio, sample_rate, profile=DEFAULT_PROFILE):
+    """Demodulates every whole symbol period in data_audio by measuring energy at the tones only.
+
+    Returns a (num_periods x carriers) matrix holding the strongest tone of each sub-band.
+    """
+    symbols = symbol_matrix(data_audio, profile.samples_per_symbol)
+    basis = tone_correlation_basis(profile, sample_rate)
+    all_tones = len(profile.frequencies)
+    values = np.empty((len(symbols), profile.carriers), dtype=np.uint8)
+    for i in range(0, len(symbols), DEMOD_BATCH_SYMBOLS):
+        # One matmul correlates every symbol against every tone's in-phase and quadrature reference
+        projections = symbols[i:i + DEMOD_BATCH_SYMBOLS] @ basis
+        energy = projections[:, :all_tones] ** 2 + projections[:, all_tones:] ** 2
+        energy = energy.reshape(-1, profile.carriers, profile.num_tones)
+        values[i:i + DEMOD_BATCH_SYMBOLS] = np.argmax(energy, axis=2)
+    return values
+
+@functools.lru_cache(maxsize=8)
+def interp_band_bins(profile, sample_rate):
+    """Returns the [start, stop) FFT bin range of every carrier's sub-band in one symbol window, reaching
+    half a tone spacing beyond its outermost tones."""
+    bin_width = sample_rate / profile.samples_per_symbol
+    last_bin = profile.samples_per_symbol // 2
+    bands = []
+    for carrier in range(profile.carriers):
+        tones = profile.frequencies[carrier * profile.num_tones:(carrier + 1) * profile.num_tones]
+        start = int(np.clip(np.ceil((tones[0] - profile.tone_spacing / 2) / bin_width), 0, last_bin))
+        stop = int(np.clip(np.floor((tones[-1] + profile.tone_spacing / 2) / bin_width) + 1, start + 1, last_bin + 1))
+        bands.append((start, stop))
+    return bands
+
+def demodulate_fft_interp(data_audio, sample_rate, profile=DEFAULT_PROFILE):
+    """Demodulates every whole symbol period in data_audio from the interpolated frequency of its peak.
+
+    The peak bin of every sub-band is refined with interpolate_peaks and rounded to the nearest tone.
+    Unlike the fft detector, which maps whole bins to tones, this keeps working when symbols are so short
+    that a bin is wider than half the tone spacing.
+    Returns a (num_periods x carriers) matrix holding the nearest tone of each sub-band.
+    """
+    symbols = symbol_matrix(data_audio, profile.samples_per_symbol)
+    bands = interp_band_bins(profile, sample_rate)
+    bin_width = sample_rate / profile.samples_per_symbol
+    values = np.empty((len(symbols), profile.carriers), dtype=np.uint8)
+    for i in range(0, len(symbols), DEMOD_BATCH_SYMBOLS):
+        spectrum = np.fft.rfft(symbols[i:i + DEMOD_BATCH_SYMBOLS], axis=1)
+        for carrier, (band_start, band_stop) in enumerate(bands):
+            band = spectrum[:, band_start:band_stop]
+            peaks = band_start + np.argmax(band.real ** 2 + band.imag ** 2, axis=1)
+            frequencies = interpolate_peaks(spectrum, peaks) * bin_width
+            lowest = profile.frequencies[carrier * profile.num_tones]
+            tones = np.rint((frequencies - lowest) / profile.tone_spacing)
+            values[i:i + DEMOD_BATCH_SYMBOLS, carrier] = np.clip(tones, 0, profile.num_tones - 1)
+    return values
+
+DETECTORS = {
+    'fft': demodulate_fft,
+    'correlator': demodulate_correlator,
+    'fft-interp': demodulate_fft_interp,
+}
+
+def detector_order(detector):
+    """Lists detector first, then the other DETECTORS to fall back on."""
+    return [detector] + [other for other in DETECTORS if other != detector]
+
+def release_mapped_pages(audio_data, stop_frame):
+    """Drops the pages of a memory-mapped WAV before stop_frame from this process's resident set.
+
+    They stay in the page cache, so this only keeps RSS bounded while streaming through a long file.
+    """
+    mapping = audio_data.base if isinstance(audio_data, np.memmap) else None
+    if not isinstance(mapping, mmap.mmap) or not hasattr(mmap, 'MADV_DONTNEED'):
         return
-    except ValueError:
-        print(f"Error: Could not read WAV file. It might be corrupted or not a WAV file.")
+    # np.memmap maps from the allocation boundary below the array's file offset
+    stop_byte = audio_data.offset % mmap.ALLOCATIONGRANULARITY + stop_frame * audio_data.strides[0]
+    stop_byte -= stop_byte % mmap.PAGESIZE
+    if stop_byte > 0:
+        mapping.madvise(mmap.MADV_DONTNEED, 0, stop_byte)
+
+# One independently synced symbol stream in a WAV: a channel index (None = all channels down-mixed),
+# the sample where its data starts and how many symbol periods it carries.
+Lane = collections.namedtuple('Lane', 'channel start_index num_symbols')
+
+def demodulate_range(audio_data, start_index, num_symbols, sample_rate, detector='fft',
+                     profile=DEFAULT_PROFILE, channel=None):
+    """Demodulates num_symbols symbol periods from start_index into a (num_symbols x carriers) matrix.
+
+    Works through DEMOD_BATCH_SYMBOLS periods at a time, taking one channel or down-mixing each window on
+    its own, which keeps memory-mapped input mapped rather than copied.
+    """
+    samples_per_symbol = profile.samples_per_symbol
+    values = np.empty((num_symbols, profile.carriers), dtype=np.uint8)
+    for first in range(0, num_symbols, DEMOD_BATCH_SYMBOLS):
+        count = min(DEMOD_BATCH_SYMBOLS, num_symbols - first)
+        window_start = start_index + profile.period_offsets(first)
+        window_stop = start_index + profile.period_offsets(first + count - 1) + samples_per_symbol
+        with stage('demodulation'):
+            window = audio_data[window_start:window_stop]
+            window = downmix(window) if channel is None else window[:, channel]
+            if profile.source_rate is not None:
+                # Periods of a fractional number of samples: gather each window from its rounded start
+                starts = profile.period_offsets(np.arange(first, first + count)) - (window_start - start_index)
+                window = np.asarray(window)
+                missing = window_stop - window_start - len(window)
+                if missing > 0:
+                    # The recording ends inside the last window (see ModemProfile.periods_in)
+                    window = np.concatenate((window, np.zeros(missing, dtype=window.dtype)))
+                window = np.lib.stride_tricks.sliding_window_view(window, samples_per_symbol)[starts]
+            values[first:first + count] = DETECTORS[detector](window, sample_rate, profile)
+        release_mapped_pages(audio_data, window_stop)
+    return values
+
+def split_lane_ranges(lanes, range_symbols, profile=DEFAULT_PROFILE):
+    """Cuts every lane into consecutive ranges of range_symbols periods.
+
+    Returns one list per range holding each lane's slice of it as a Lane (possibly empty).
+    """
+    longest = max(lane.num_symbols for lane in lanes)
+    return [[Lane(lane.channel, lane.start_index + profile.period_offsets(first),
+                  max(0, min(range_symbols, lane.num_symbols - first))) for lane in lanes]
+            for first in range(0, longest, range_symbols)]
+
+def merge_lanes(lane_values, profile=DEFAULT_PROFILE):
+    """Interleaves per-lane (n x carriers) symbol matrices period by period back into one symbol stream.
+
+    Lanes may be one period short at the end of the stream, exactly as the encoder dealt them.
+    """
+    if len(lane_values) == 1:
+        return lane_values[0].reshape(-1)
+    longest = max(len(values) for values in lane_values)
+    stacked = np.zeros((longest, len(lane_values), profile.carriers), dtype=np.uint8)
+    present = np.zeros((longest, len(lane_values)), dtype=bool)
+    for lane, values in enumerate(lane_values):
+        stacked[:len(values), lane] = values
+        present[:len(values), lane] = True
+    return stacked[present].reshape(-1)
+
+# Memory-mapped WAV of the file being decoded, opened once in each pool worker
+_worker_audio = None
+
+def _init_decode_worker(input_path):
+    global _worker_audio
+    _, _worker_audio = read_wav(input_path, memory_map=True)
+
+def _demodulate_lane_range(lane, sample_rate, detector, profile):
+    """Pool task: demodulates one lane's slice of a range from the worker's mapped WAV."""
+    return demodulate_range(_worker_audio, lane.start_index, lane.num_symbols, sample_rate, detector,
+                            profile, lane.channel)
+
+def iter_decoded_blocks(audio_data, lanes, sample_rate, detector='fft', profile=DEFAULT_PROFILE,
+                        input_path=None, workers=1):
+    """Demodulates the lanes range by range, yielding the decoded bytes of each range in stream order.
+
+    Ranges hold a multiple of 8 periods per lane, so bytes never straddle two of them. With workers > 1
+    every lane's slice of a range is a separate task in a process pool; workers map input_path
+    themselves, so only range bounds and symbol values cross process boundaries.
+    """
+    if workers <= 1:
+        for lane_ranges in split_lane_ranges(lanes, DEMOD_BATCH_SYMBOLS, profile):
+            lane_values = [demodulate_range(audio_data, lane.start_index, lane.num_symbols, sample_rate,
+                                            detector, profile, lane.channel) for lane in lane_ranges]
+            count_processed('symbols', sum(lane.num_symbols for lane in lane_ranges))
+            with stage('byte packing'):
+                decoded = symbols_to_bytes(merge_lanes(lane_values, profile), profile.bits_per_symbol)
+            yield decoded
         return
 
-    if rate != SAMPLE_RATE:
-        print(f"Warning: Audio sample rate ({rate}Hz) differs from expected ({SAMPLE_RATE}Hz).")
-
-    if len(audio_data.shape) > 1: audio_data = audio_data.mean(axis=1)
-
-    print("Searching for sync header...")
-    sync_found = False
-    start_index = -1
-    chunk_size = SAMPLES_PER_SYNC_HEADER
-    for i in range(0, len(audio_data) - chunk_size, chunk_size // 4):
-        chunk = audio_data[i:i+chunk_size]
-        freq = find_dominant_frequency(chunk, rate)
-        if abs(freq - SYNC_HEADER_FREQ) < 20:
-            start_index = i + chunk_size
-            sync_found = True
-            break
-            
-    if not sync_found:
-        print("Error: Sync header not found. Cannot decode.")
+    from concurrent.futures import ProcessPoolExecutor
+    ranges = split_lane_ranges(lanes, PARALLEL_RANGE_SYMBOLS, profile)
+    tasks = [lane for lane_ranges in ranges for lane in lane_ranges]
+    with ProcessPoolExecutor(workers, initializer=_init_decode_worker, initargs=(input_path,)) as pool:
+        results = pool.map(_demodulate_lane_range, tasks, itertools.repeat(sample_rate),
+                           itertools.repeat(detector), itertools.repeat(profile))
+        for lane_ranges in ranges:
+            with stage('demodulation'):
+                lane_values = [next(results) for _ in lane_ranges]
+            count_processed('symbols', sum(lane.num_symbols for lane in lane_ranges))
+            with stage('byte packing'):
+                decoded = symbols_to_bytes(merge_lanes(lane_values, profile), profile.bits_per_symbol)
+            yield decoded
+
+def lane_ends_silent(audio_data, lane, profile=DEFAULT_PROFILE):
+    """True when the last symbol period of a lane is silence, i.e. the encoder padded it."""
+    if lane.num_symbols < 2:
+        return False
+    samples_per_symbol = profile.samples_per_symbol
+    last_start = lane.start_index + profile.period_offsets(lane.num_symbols - 1)
+    tail = np.square(audio_data[last_start - samples_per_symbol:last_start + samples_per_symbol, lane.channel],
+                     dtype=np.float64)
+    # Mean power, as the recording may end a little before the last window does
+    return tail[samples_per_symbol:].mean() < LANE_SILENCE_RATIO * tail[:samples_per_symbol].mean()
+
+def demodulate_periods(audio_data, lanes, first_period, num_periods, sample_rate, detector='fft',
+                       profile=DEFAULT_PROFILE, offset=0):
+    """Demodulates periods [first_period, first_period + num_periods) of the stream that the lanes carry
+    together, with every lane's audio shifted by offset samples.
+
+    Returns a (periods x carriers) matrix, cut short where the recording ends.
+    """
+    num_lanes = len(lanes)
+    lane_first = first_period // num_lanes
+    lane_stop = -(-(first_period + num_periods) // num_lanes)
+    lane_values = []
+    for lane in lanes:
+        start_index = max(lane.start_index + offset + profile.period_offsets(lane_first), 0)
+        available = profile.periods_in(len(audio_data) - start_index)
+        lane_values.append(demodulate_range(audio_data, start_index, min(lane_stop - lane_first, available),
+                                            sample_rate, detector, profile, lane.channel))
+    values = merge_lanes(lane_values, profile).reshape(-1, profile.carriers)
+    skip = first_period - lane_first * num_lanes
+    return values[skip:skip + num_periods]
+
+def demodulate_segment(audio_data, lanes, first_period, size, sample_rate, detector='fft',
+                       profile=DEFAULT_PROFILE, offset=0):
+    """Demodulates the size bytes of a framed-format segment starting at first_period."""
+    values = demodulate_periods(audio_data, lanes, first_period, profile.symbols_for_bytes(size),
+                                sample_rate, detector, profile, offset)
+    with stage('byte packing'):
+        return symbols_to_bytes(values.reshape(-1), profile.bits_per_symbol)[:size].tobytes()
+
+def read_frame_header(audio_data, lanes, sample_rate, detector='fft', profile=DEFAULT_PROFILE):
+    """Looks for a framed-format header at the start of the stream, trying the other detectors if needed.
+
+    The header is first checked as received; failing that, as corrected by the Reed-Solomon parity that
+    follows it in FEC streams. Returns the FrameHeader, or None for unframed audio.
+    """
+    coded_size = rs_coded_size(FRAME_HEADER_SIZE, FRAME_HEADER_FEC_SYMBOLS)
+    for name in detector_order(detector):
+        data = demodulate_segment(audio_data, lanes, 0, coded_size, sample_rate, name, profile)
+        header = unpack_frame_header(data)
+        if header is None:
+            header = unpack_frame_header(rs_decode(data, FRAME_HEADER_SIZE, FRAME_HEADER_FEC_SYMBOLS)[0])
+            if header is not None and not header.flags & FRAME_FLAG_FEC:
+                header = None
+        if header is not None:
+            return header
+    return None
+
+def decode_frame_block(audio_data, lanes, block, sample_rate, detector='fft', profile=DEFAULT_PROFILE,
+                       fec_symbols=0):
+    """Decodes one framed-format block, corrects it if it carries FEC and checks its CRC32.
+
+    A block failing its check is demodulated again with the other detectors, then with the audio
+    shifted by each of FRAME_RETRY_OFFSETS samples. Returns (payload, attempts, corrected bytes), with
+    attempts = 0 if no attempt passed; the payload is then the first attempt's best guess.
+    """
+    detectors = detector_order(detector)
+    attempts = [(name, 0) for name in detectors]
+    attempts += [(name, offset) for offset in FRAME_RETRY_OFFSETS for name in detectors]
+    best_guess = None
+    data_size = block.size + FRAME_CRC_SIZE
+    for attempt, (name, offset) in enumerate(attempts, 1):
+        data = demodulate_segment(audio_data, lanes, block.first_period, frame_segment_size(data_size, fec_symbols),
+                                  sample_rate, name, profile, offset)
+        corrected = 0
+        with stage('framing'):
+            if fec_symbols:
+                data, corrected, _ = rs_decode(data, data_size, fec_symbols)
+            payload, crc = data[:block.size], data[block.size:]
+            intact = crc == struct.pack('<I', zlib.crc32(payload))
+        if intact:
+            return payload, attempt, corrected
+        if best_guess is None:
+            best_guess = payload
+    return best_guess, 0, 0
+
+def _decode_worker_frame_block(block, lanes, sample_rate, detector, profile, fec_symbols):
+    """Pool task: decodes one framed-format block from the worker's mapped WAV."""
+    return decode_frame_block(_worker_audio, lanes, block, sample_rate, detector, profile, fec_symbols)
+
+def iter_frame_payload(audio_data, lanes, header, sample_rate, detector='fft', profile=DEFAULT_PROFILE,
+                       input_path=None, workers=1):
+    """Decodes the payload blocks of a framed stream in order, yielding (block, payload, attempts,
+    corrected bytes).
+
+    Only the periods the header accounts for are demodulated; for a streamed payload, as many blocks as
+    the lanes hold. With workers > 1 blocks are decoded, and retried, independently in a process pool.
+    """
+    blocks = list(header_blocks(header, profile, sum(lane.num_symbols for lane in lanes)))
+    if workers <= 1:
+        for block in blocks:
+            yield (block,) + decode_frame_block(audio_data, lanes, block, sample_rate, detector, profile,
+                                                header.fec_symbols)
         return
-        
-    print(f"Sync header found. Data starts at sample {start_index}.")
-    
-    data_audio = audio_data[start_index:]
-    num_symbols = len(data_audio) // SAMPLES_PER_SYMBOL
+    from concurrent.futures import ProcessPoolExecutor
+    pool = ProcessPoolExecutor(workers, initializer=_init_decode_worker, initargs=(input_path,))
+    unsubmitted = iter(blocks)
+    pending = collections.deque()
+    try:
+        for block in blocks:
+            for queued in itertools.islice(unsubmitted, PARALLEL_BLOCKS_AHEAD * workers - len(pending)):
+                pending.append(pool.submit(_decode_worker_frame_block, queued, lanes, sample_rate, detector,
+                                           profile, header.fec_symbols))
+            with stage('demodulation'):
+                result = pending.popleft().result()
+            yield (block,) + result
+    finally:
+        # Reached early when the consumer stops at a streamed payload's last block: queued blocks are
+        # dropped, and only the few already running are waited on
+        pool.shutdown(cancel_futures=True)
+
+def profile_mismatch(header, profile=DEFAULT_PROFILE):
+    """Describes how a framed header's tone plan differs from profile, or returns None if it matches."""
+    profile = profile.source
+    expected = (profile.bits_per_symbol, profile.carriers, profile.samples_per_symbol)
+    found = (header.bits_per_symbol, header.carriers, header.samples_per_symbol)
+    if expected != found or not np.isclose(header.tone_spacing, profile.tone_spacing) \
+            or not np.isclose(header.base_frequency, profile.base_frequency):
+        return (f"{header.bits_per_symbol} bits x {header.carriers} carriers, "
+                f"{header.samples_per_symbol} samples/symbol, {header.tone_spacing:g} Hz spacing")
+    return None
+
+# Outcome of decoding a framed stream: bytes written, Reed-Solomon corrections, indices of blocks that
+# needed retries or failed their CRC, and what went wrong decompressing the payload (None if nothing).
+FramedResult = collections.namedtuple('FramedResult', 'byte_count corrected retried failed decompression_error')
+
+def decode_framed(audio_data, lanes, header, write, sample_rate, detector='fft', profile=DEFAULT_PROFILE,
+                  input_path=None, workers=1):
+    """Passes the payload of a framed stream to write, decompressing it if its header names a codec.
+
+    Blocks failing their CRC are still written, as best guesses. A streamed payload ends at its first
+    short block. Returns a FramedResult.
+    """
+    streamed = header.flags & FRAME_FLAG_STREAMED
+    codec = codec_from_flags(header.flags)
+    decompressor = CODECS[codec][2]() if codec else None
+    blocks = iter_frame_payload(audio_data, lanes, header, sample_rate, detector, profile, input_path, workers)
+    byte_count = 0
+    corrected_bytes = 0
+    retried = []
+    failed = []
+    ended = not streamed
+    # Closing the generator at once lets a worker pool stop on a streamed payload's last block
+    with contextlib.closing(blocks):
+        for block, payload, attempts, corrected in blocks:
+            # Each block's periods count once, however many detectors and offsets it took
+            count_processed('symbols', profile.symbols_for_bytes(
+                frame_segment_size(block.size + FRAME_CRC_SIZE, header.fec_symbols)))
+            if streamed:
+                payload, ended = split_streamed_block(payload, header.block_size)
+            corrected_bytes += corrected
+            if attempts == 0:
+                failed.append(block.index)
+            elif attempts > 1:
+                retried.append(block.index)
+            if decompressor is not None:
+                try:
+                    with stage('decompression'):
+                        payload = decompressor.decompress(payload)
+                except (zlib.error, OSError, lzma.LZMAError, EOFError):
+                    return FramedResult(byte_count, corrected_bytes, retried, failed,
+                                        f"Decompression failed in block {block.index}")
+            write(payload)
+            byte_count += len(payload)
+            if ended and streamed:
+                break
+    error = None
+    if not ended:
+        error = "Stream ended before its last block"
+    elif decompressor is not None and not decompressor.eof:
+        error = "Compressed stream ended early"
+    return FramedResult(byte_count, corrected_bytes, retried, failed, error)
+
+def read_preamble(audio_data, start_index, sample_rate, detector='fft'):
+    """Reads a self-describing preamble starting at start_index, trying the other detectors if needed.
+
+    Returns (profile, flags, fec_symbols), or None if the stream has no preamble.
+    """
+    described = preamble_profile(sample_rate)
+    coded_size = rs_coded_size(PREAMBLE_SIZE, PREAMBLE_FEC_SYMBOLS)
+    num_symbols = described.symbols_for_bytes(coded_size)
+    if (len(audio_data) - start_index) // described.samples_per_symbol < num_symbols:
+        return None
+    for name in detector_order(detector):
+        values = demodulate_range(audio_data, start_index, num_symbols, sample_rate, name, described)
+        preamble = unpack_preamble(symbols_to_bytes(values.reshape(-1), described.bits_per_symbol).tobytes())
+        if preamble is not None:
+            return preamble
+    return None
+
+def find_stream_start(audio_data, sample_rate, profile=DEFAULT_PROFILE, detector='fft'):
+    """Finds where data starts in a (single-lane) recording and what describes it.
+
+    A legacy sync header followed by a valid preamble marks a self-describing stream; otherwise the sync
+    header of profile is searched for. Returns (data start or -1, preamble tuple or None).
+    """
+    described = preamble_profile(sample_rate)
+    start_index, search_end = -1, len(audio_data)
+    if profile.sync_frequency != described.sync_frequency:
+        # A stream of this profile is found in one pass, and a self-describing stream ahead of it can
+        # only start before its sync header, so the legacy search need not scan the rest of the audio.
+        start_index = find_sync(audio_data, sample_rate, profile)
+        if start_index >= 0:
+            search_end = start_index - profile.samples_per_sync_header
+    legacy_hit = find_sync_hit(audio_data[:search_end], sample_rate, described)
+    if legacy_hit >= 0:
+        legacy_start = find_sync_end(audio_data, legacy_hit, sample_rate, described)
+        preamble = read_preamble(audio_data, legacy_start, sample_rate, detector)
+        if preamble is not None:
+            return legacy_start + preamble_samples(sample_rate), preamble
+        if profile.sync_frequency == described.sync_frequency:
+            return legacy_start, None
+    return start_index, None
+
+class WavetransError(Exception):
+    """Raised when a recording cannot be decoded."""
+
+# Where a recording's stream lies: its lanes, the tone plan it uses and its frame header (None if unframed).
+StreamLayout = collections.namedtuple('StreamLayout', 'lanes profile header')
+
+def locate_stream(audio_data, rate, detector='fft', profile=DEFAULT_PROFILE, lanes=False, verbose=False):
+    """Syncs every lane of MFSK audio at rate samples per second and reads its preamble and frame header.
+
+    See decode for the options. Progress is printed only when verbose. Returns a StreamLayout, whose
+    profile is at the audio's rate (see ModemProfile.at_rate), or raises WavetransError if there is no
+    stream to decode.
+    """
+    say = print if verbose else lambda message: None
+    if detector not in DETECTORS:
+        raise ValueError(f"Unknown detector '{detector}'.")
+    try:
+        recorded = profile.at_rate(rate)
+    except ValueError as e:
+        raise WavetransError(f"Cannot demodulate {rate} Hz audio: {e}")
+    channels = [None]
+    if lanes and audio_data.ndim > 1:
+        channels = list(range(audio_data.shape[1]))
+
+    say("Searching for sync header...")
+    decode_lanes = []
+    stream_preamble = None
+    for channel in channels:
+        lane_audio = audio_data if channel is None else audio_data[:, channel]
+        with stage('sync search'):
+            start_index, preamble = find_stream_start(lane_audio, rate, recorded, detector)
+        if start_index < 0:
+            raise WavetransError("Sync header not found. Cannot decode.")
+        if decode_lanes and preamble != stream_preamble:
+            raise WavetransError(f"Lane {channel} does not carry the same stream description as lane 0.")
+        if preamble is not None and stream_preamble is None:
+            stream_preamble = preamble
+            if profile != DEFAULT_PROFILE and profile != preamble[0]:
+                say("Note: ignoring the tone-plan options; the stream describes its own.")
+            profile = preamble[0]
+            say(f"Stream preamble: {profile.describe()}.")
+            try:
+                recorded = profile.at_rate(rate)
+            except ValueError as e:
+                raise WavetransError(f"Cannot demodulate {rate} Hz audio: {e}")
+        lane = Lane(channel, start_index, recorded.periods_in(len(audio_data) - start_index))
+        if channel is None:
+            say(f"Sync header found. Data starts at sample {start_index}.")
+        else:
+            say(f"Lane {channel}: sync header found. Data starts at sample {start_index}.")
+            with stage('sync search'):
+                padded = lane_ends_silent(audio_data, lane, recorded)
+            if padded:
+                lane = lane._replace(num_symbols=lane.num_symbols - 1)
+        decode_lanes.append(lane)
+
+    if rate != profile.sample_rate:
+        say(f"Note: audio recorded at {rate} Hz, synthesized at {profile.sample_rate} Hz; "
+            f"demodulating at {rate} Hz.")
+    profile = recorded
+
+    header = read_frame_header(audio_data, decode_lanes, rate, detector, profile)
+    if header is None and stream_preamble is not None and stream_preamble[1] & PREAMBLE_FLAG_FRAMED:
+        raise WavetransError("The preamble announces a framed stream, but its frame header could not be read.")
+    if header is not None:
+        mismatch = profile_mismatch(header, profile)
+        if mismatch:
+            raise WavetransError(f"Stream was encoded with a different tone plan ({mismatch}).")
+        return StreamLayout(decode_lanes, profile, header)
+
+    num_symbols = sum(lane.num_symbols for lane in decode_lanes)
     if num_symbols == 0:
-        print("Error: Not enough audio data after sync header.")
+        raise WavetransError("Not enough audio data after sync header.")
+    if num_symbols * profile.bits_per_period < 8:
+        raise WavetransError("Decoded bits do not form a full byte.")
+    return StreamLayout(decode_lanes, profile, None)
+
+def decode_stream(audio_data, rate, layout, write, detector='fft', input_path=None, workers=1):
+    """Demodulates the stream found by locate_stream, passing the decoded bytes to write as they come.
+
+    workers > 1 needs the WAV's input_path, which the pool processes map. Returns the FramedResult of a
+    framed stream, or None for an unframed one.
+    """
+    if layout.header is not None:
+        return decode_framed(audio_data, layout.lanes, layout.header, write, rate, detector, layout.profile,
+                             input_path, workers)
+    for decoded_bytes in iter_decoded_blocks(audio_data, layout.lanes, rate, detector, layout.profile,
+                                             input_path, workers):
+        write(decoded_bytes)
+    return None
+
+def decode_samples(samples, sample_rate=SAMPLE_RATE, detector='fft', profile=DEFAULT_PROFILE, lanes=False):
+    """Decodes MFSK audio held in an array (1-D, or frames x channels) back into bytes, without touching
+    the disk or printing.
+
+    Raises WavetransError if no stream is found, if a framed block fails its CRC or if decompression
+    fails; the CLI's decode writes such damaged output anyway, with warnings.
+    """
+    samples = np.asarray(samples)
+    layout = locate_stream(samples, sample_rate, detector, profile, lanes)
+    chunks = []
+    result = decode_stream(samples, sample_rate, layout, chunks.append, detector)
+    if result is not None and result.failed:
+        raise WavetransError(f"{len(result.failed)} block(s) failed their CRC: {result.failed}")
+    if result is not None and result.decompression_error:
+        raise WavetransError(f"{result.decompression_error}.")
+    return b''.join(chunks)
+
+def decode_file(input_path, output_path, detector='fft', workers=None, profile=DEFAULT_PROFILE, lanes=False,
+                verbose=False):
+    """Decodes an MFSK WAV file into a file, as decode does, and returns (bytes written, FramedResult or
+    None for an unframed stream).
+
+    Prints progress only when verbose. Raises OSError if a file cannot be opened and WavetransError if
+    the WAV holds no decodable stream; the output file is only created once the stream is found.
+    """
+    try:
+        with stage('read'):
+            rate, audio_data = read_wav(input_path, memory_map=True)
+    except ValueError:
+        raise WavetransError("Could not read WAV file. It might be corrupted or not a WAV file.")
+    layout = locate_stream(audio_data, rate, detector, profile, lanes, verbose)
+    if workers is None:
+        workers = len(layout.lanes)
+
+    header = layout.header
+    if verbose and header is None:
+        num_symbols = sum(lane.num_symbols for lane in layout.lanes)
+        print(f"Decoding {num_symbols} symbols into '{output_path}'...")
+    elif verbose:
+        num_blocks = -(-header.payload_length // header.block_size)
+        fec = f", RS FEC with {header.fec_symbols} parity bytes per codeword" if header.fec_symbols else ""
+        codec = codec_from_flags(header.flags)
+        compressed = f", {codec}-compressed" if codec else ""
+        if header.flags & FRAME_FLAG_STREAMED:
+            size = f"streamed payload in blocks of {header.block_size}"
+        else:
+            size = f"{header.payload_length} bytes in {num_blocks} blocks of {header.block_size}"
+        print(f"Framed stream: {size}{fec}{compressed}. Decoding into '{output_path}'...")
+    byte_count = 0
+    with open_path(output_path, 'wb') as f:
+        def write(data):
+            nonlocal byte_count
+            with stage('write'):
+                f.write(data)
+            byte_count += len(data)
+            count_processed('bytes', len(data))
+        result = decode_stream(audio_data, rate, layout, write, detector, input_path, workers)
+    return byte_count, result
+
+def report_framed_result(result):
+    """Prints the corrections, retries and failures of a framed decode (nothing for None)."""
+    if result is None:
         return
+    if result.decompression_error:
+        print(f"Warning: {result.decompression_error}; output may be truncated.")
+    if result.corrected:
+        print(f"Reed-Solomon corrected {result.corrected} byte error(s).")
+    if result.retried:
+        print(f"Recovered {len(result.retried)} block(s) by retrying: {result.retried}")
+    if result.failed:
+        print(f"Warning: {len(result.failed)} block(s) failed their CRC and may be corrupted: {result.failed}")
+
+def decode(input_path, output_path, detector='fft', workers=None, profile=DEFAULT_PROFILE, lanes=False):
+    """Decodes a high-density MFSK WAV audio file back into a file.
 
-    print(f"Decoding {num_symbols} symbols...")
-    
-    decoded_values = []
-    for i in range(num_symbols):
-        chunk = data_audio[i * SAMPLES_PER_SYMBOL : (i + 1) * SAMPLES_PER_SYMBOL]
-        dom_freq = find_dominant_frequency(chunk, rate)
-        
-        # Find the closest frequency in our MFSK set
-        freq_errors = np.abs(FREQUENCIES - dom_freq)
-        best_match_index = np.argmin(freq_errors)
-        decoded_values.append(best_match_index)
-
-    # Convert values (0-15) back to bits
-    bit_stream = np.unpackbits(np.array(decoded_values, dtype=np.uint8)[:, np.newaxis], axis=1)
-    # We only care about the lower 4 bits of each unpacked byte
-    bits = bit_stream[:, 4:].flatten()
-
-    # Pack bits into bytes
-    byte_count = len(bits) // 8
-    if byte_count == 0:
-        print("Error: Decoded bits do not form a full byte.")
+    The WAV is memory-mapped and decoded bytes are written as each window is demodulated, so memory use
+    stays bounded for recordings of any length. With workers > 1 the symbol ranges after the sync header
+    are demodulated in parallel processes. With lanes, every channel is synced and demodulated as an
+    independent lane (by default one worker per lane) and the lanes are merged back into one stream.
+    A framed stream is recognized by its header: decoding then stops at the end of the payload and
+    blocks are checked, and retried, one by one. A self-describing stream's preamble overrides profile.
+    A recording made at another sample rate than the signal's is demodulated at its own rate, with
+    symbol windows and tone bins recomputed for it (see ModemProfile.at_rate).
+
+    An output_path of '-' writes to stdout, with progress on stderr. An input_path of '-' reads the WAV
+    from stdin as it arrives, with decode_live_source; workers and lanes do not apply then.
+    """
+    if input_path == STDIO_PATH:
+        decode_live_source(input_path, output_path, detector, profile)
         return
-    
-    bits = bits[:byte_count * 8]
-    decoded_bytes = np.packbits(bits)
+    with progress_output(output_path):
+        print(f"Reading audio from '{input_path}'...")
+        try:
+            byte_count, result = decode_file(input_path, output_path, detector, workers, profile, lanes,
+                                             verbose=True)
+        except FileNotFoundError as e:
+            if e.filename != input_path:
+                raise
+            print(f"Error: Input WAV file not found at '{input_path}'")
+            return
+        except WavetransError as e:
+            print(f"Error: {e}")
+            return
+
+        report_framed_result(result)
+        print(f"Decoding complete! Wrote {byte_count} bytes.")
+
+class StreamDecoder:
+    """Decodes MFSK audio fed to it in pieces of any size, emitting bytes as soon as they are complete.
+
+    Incoming frames are down-mixed into a sample buffer holding only what is still needed: before sync
+    every new window is scanned once, and afterwards each completed symbol period is demodulated and
+    dropped. The buffer is compacted in place rather than wrapped, so the detectors always see contiguous
+    windows. Complete periods are demodulated in batches spanning max_latency seconds of audio (default:
+    one symbol period, i.e. each as soon as it completes); flush() takes whatever is complete now.
+
+    A self-describing stream is recognized by its preamble. Otherwise the first few bytes tell a framed
+    stream, emitted block by block as each passes its CRC, from an unframed one. Multichannel audio is
+    down-mixed; lanes are not supported.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=1, profile=DEFAULT_PROFILE, detector='fft',
+                 max_latency=None):
+        if detector not in DETECTORS:
+            raise ValueError(f"Unknown detector '{detector}'.")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.profile = profile.at_rate(sample_rate)
+        self.detector = detector
+        self.max_latency = max_latency
+        self.buffer = np.empty(0, dtype=np.float32)
+        self.buffer_start = 0 # Stream sample index of buffer[0]
+        self.buffer_stop = 0 # Stream sample index just past the last buffered sample
+        self.partial_frame = b''
+        # Sync tones searched for, each with the stream sample its next unscanned window starts at
+        described = preamble_profile(sample_rate)
+        self.scan_from = {described: 0}
+        if profile.sync_frequency != described.sync_frequency:
+            self.scan_from[self.profile] = 0
+        self.sync_hit = None # (profile whose sync tone was found, stream sample of the hit)
+        self.data_start = None # Stream sample of the first data symbol period
+        self.framed = None # Unknown until the preamble or the first bytes tell; True once announced
+        self.header = None
+        self.next_period = 0 # Unframed: symbol periods demodulated so far
+        self.pending_symbols = np.empty(0, dtype=np.uint8)
+        self.blocks = iter(()) # Framed: layout of the blocks still to decode, from header_blocks
+        self.block = None # Framed: the next block to decode
+        self.decompressor = None
+        self.byte_count = 0
+        self.corrected = 0
+        self.retried = []
+        self.failed = []
+        self.decompression_error = None
+        self.done = False
+
+    @property
+    def result(self):
+        """FramedResult of a framed stream so far, or None for an unframed (or not yet framed) one."""
+        if self.header is None:
+            return None
+        return FramedResult(self.byte_count, self.corrected, self.retried, self.failed, self.decompression_error)
+
+    def feed(self, data):
+        """Adds little-endian int16 frames from a bytes-like object and returns the bytes now decoded.
+
+        A trailing partial frame is kept for the next call.
+        """
+        block_align = 2 * self.channels
+        if self.partial_frame:
+            data = self.partial_frame + bytes(data)
+        whole = len(data) - len(data) % block_align
+        self.partial_frame = bytes(memoryview(data)[whole:])
+        samples = np.frombuffer(data, dtype='<i2', count=whole // 2)
+        return self.feed_samples(samples.reshape(-1, self.channels) if self.channels > 1 else samples)
+
+    def feed_samples(self, samples):
+        """Adds an array of samples (1-D, or frames x channels) and returns the bytes now decoded."""
+        if self.done:
+            return b''
+        samples = downmix(np.asarray(samples))
+        kept = self.buffer_stop - self.buffer_start
+        if kept + len(samples) > len(self.buffer):
+            grown = np.empty(max(kept + len(samples), 2 * len(self.buffer)), dtype=np.float32)
+            grown[:kept] = self.buffer[:kept]
+            self.buffer = grown
+        self.buffer[kept:kept + len(samples)] = samples
+        self.buffer_stop += len(samples)
+        return self._advance(force=False, final=False)
+
+    def flush(self):
+        """Demodulates every complete symbol period without waiting for max_latency of them."""
+        return self._advance(force=True, final=False)
+
+    def finish(self):
+        """Ends the stream and returns the last bytes. Raises WavetransError if no stream was found."""
+        data = self._advance(force=True, final=True)
+        if self.data_start is None:
+            raise WavetransError("Sync header not found. Cannot decode.")
+        if self.decompressor is not None and not self.decompressor.eof and self.decompression_error is None:
+            self.decompression_error = "Compressed stream ended early"
+        self.done = True
+        return data
+
+    def _audio(self):
+        return self.buffer[:self.buffer_stop - self.buffer_start]
+
+    def _discard(self, stop):
+        """Drops the buffered samples before stream sample stop."""
+        drop = min(stop, self.buffer_stop) - self.buffer_start
+        if drop <= 0:
+            return
+        kept = self.buffer_stop - self.buffer_start - drop
+        self.buffer[:kept] = self.buffer[drop:drop + kept]
+        self.buffer_start += drop
+
+    def _lane(self):
+        return Lane(None, self.data_start - self.buffer_start, 0)
+
+    def _advance(self, force, final):
+        if self.done:
+            return b''
+        if self.data_start is None:
+            with stage('sync search'):
+                found = self._find_start(final)
+            if not found:
+                return b''
+        if self.framed is not False and self.header is None and not self._detect_framing(final):
+            return b''
+        output = []
+        if self.framed:
+            self._decode_blocks(output, final)
+        else:
+            self._decode_periods(output, force, final)
+        return b''.join(output)
+
+    def _find_start(self, final):
+        """Searches the new audio for a sync header and reads the preamble after the legacy one."""
+        audio = self._audio()
+        if self.sync_hit is None:
+            for candidate, scan_from in self.scan_from.items():
+                hit = find_sync_hit(audio[scan_from - self.buffer_start:], self.sample_rate, candidate)
+                if hit >= 0:
+                    self.sync_hit = (candidate, scan_from + hit)
+                    break
+                self.scan_from[candidate] = max(scan_from, self.buffer_stop - candidate.samples_per_sync_header + 1)
+            else:
+                self._discard(min(self.scan_from.values()))
+                return False
+        candidate, hit = self.sync_hit
+        if self.buffer_stop < hit + sync_refine_samples(candidate) and not final:
+            return False
+        start = self.buffer_start + find_sync_end(audio, hit - self.buffer_start, self.sample_rate, candidate)
+        described = preamble_profile(self.sample_rate)
+        if candidate == described:
+            magic = self._preamble_magic(start, final)
+            if magic is None:
+                return False
+            preamble = None
+            if magic:
+                if self.buffer_stop < start + preamble_samples(self.sample_rate) and not final:
+                    return False
+                preamble = read_preamble(audio, start - self.buffer_start, self.sample_rate, self.detector)
+            if preamble is not None:
+                try:
+                    self.profile = preamble[0].at_rate(self.sample_rate)
+                except ValueError as e:
+                    raise WavetransError(f"Cannot demodulate {self.sample_rate} Hz audio: {e}")
+                self.framed = True if preamble[1] & PREAMBLE_FLAG_FRAMED else None
+                start += preamble_samples(self.sample_rate)
+            elif described.sync_frequency != self.profile.sync_frequency:
+                # A legacy sync tone without a preamble is not this stream's; go on looking for profile's
+                del self.scan_from[described]
+                self.sync_hit = None
+                return self._find_start(final)
+        self.data_start = start
+        self._discard(start)
+        return True
 
-    print(f"Writing {len(decoded_bytes)} bytes to '{output_path}'...")
-    with open(output_path, 'wb') as f:
-        f.write(decoded_bytes)
-        
-    print("Decoding complete!")
+    def _preamble_magic(self, start, final):
+        """Whether the audio after the legacy sync header ending at start may open with a preamble, or None
+        until enough of it has arrived to tell."""
+        described = preamble_profile(self.sample_rate)
+        magic_periods = described.symbols_for_bytes(len(PREAMBLE_MAGIC))
+        if self.buffer_stop - start < magic_periods * described.samples_per_symbol:
+            return False if final else None
+        lane = Lane(None, start - self.buffer_start, 0)
+        for name in detector_order(self.detector):
+            prefix = demodulate_segment(self._audio(), [lane], 0, len(PREAMBLE_MAGIC), self.sample_rate, name, described)
+            if sum(a == b for a, b in zip(prefix, PREAMBLE_MAGIC)) >= PREAMBLE_MAGIC_MATCHES:
+                return True
+        return False
+
+    def _available_periods(self, first_period, final=False):
+        received = self.buffer_stop - self.data_start - self.profile.period_offsets(first_period)
+        return self.profile.periods_in(received, ended=final)
+
+    def _detect_framing(self, final):
+        """Tells framed from unframed data once enough of it has arrived; reads the frame header."""
+        profile = self.profile
+        if self.framed is None:
+            magic_periods = profile.symbols_for_bytes(len(FRAME_MAGIC))
+            if self._available_periods(0) < magic_periods and not final:
+                return False
+            prefix = demodulate_segment(self._audio(), [self._lane()], 0, len(FRAME_MAGIC), self.sample_rate,
+                                        self.detector, profile)
+            if sum(a == b for a, b in zip(prefix, FRAME_MAGIC)) < STREAM_MAGIC_MATCHES:
+                self.framed = False
+                return True
+        coded_size = rs_coded_size(FRAME_HEADER_SIZE, FRAME_HEADER_FEC_SYMBOLS)
+        if self._available_periods(0) < profile.symbols_for_bytes(coded_size) and not final:
+            return False
+        header = read_frame_header(self._audio(), [self._lane()], self.sample_rate, self.detector, profile)
+        if header is None and self.framed:
+            raise WavetransError("The preamble announces a framed stream, but its frame header could not be read.")
+        if header is None:
+            self.framed = False
+            return True
+        mismatch = profile_mismatch(header, profile)
+        if mismatch:
+            raise WavetransError(f"Stream was encoded with a different tone plan ({mismatch}).")
+        self.framed = True
+        self.header = header
+        self.blocks = iter(header_blocks(header, profile))
+        self.block = next(self.blocks, None)
+        codec = codec_from_flags(header.flags)
+        self.decompressor = CODECS[codec][2]() if codec else None
+        return True
+
+    def _decode_periods(self, output, force, final):
+        """Unframed: demodulates the complete symbol periods once a batch of them is ready."""
+        profile = self.profile
+        available = self._available_periods(self.next_period, final)
+        batch = max(1, int(round((self.max_latency or profile.symbol_duration) / profile.symbol_duration)))
+        if available and (available >= batch or force):
+            first = self.data_start + profile.period_offsets(self.next_period)
+            values = demodulate_range(self._audio(), first - self.buffer_start, available, self.sample_rate,
+                                      self.detector, profile)
+            count_processed('symbols', available)
+            self.next_period += available
+            self._discard(self.data_start + profile.period_offsets(self.next_period))
+            self.pending_symbols = np.concatenate((self.pending_symbols, values.reshape(-1)))
+        # Only whole groups of symbols fill whole bytes; the rest waits for the next symbols
+        group = math.lcm(profile.bits_per_symbol, 8) // profile.bits_per_symbol
+        usable = len(self.pending_symbols) if final else len(self.pending_symbols) // group * group
+        if usable:
+            with stage('byte packing'):
+                data = symbols_to_bytes(self.pending_symbols[:usable], profile.bits_per_symbol).tobytes()
+            self.pending_symbols = self.pending_symbols[usable:]
+            self.byte_count += len(data)
+            output.append(data)
+
+    def _decode_blocks(self, output, final):
+        """Framed: decodes every block whose audio, retry margin included, has arrived."""
+        profile = self.profile
+        fec_symbols = self.header.fec_symbols
+        streamed = self.header.flags & FRAME_FLAG_STREAMED
+        while self.block is not None:
+            block = self.block
+            stop_period = block.first_period + profile.symbols_for_bytes(
+                frame_segment_size(block.size + FRAME_CRC_SIZE, fec_symbols))
+            stop = self.data_start + profile.period_offsets(stop_period)
+            if self.buffer_stop < stop + max(FRAME_RETRY_OFFSETS) and not final:
+                return
+            if streamed and self.buffer_stop < stop:
+                # A streamed payload's blocks go on until its last one; this one never arrived
+                self.decompression_error = "Stream ended before its last block"
+                break
+            payload, attempts, corrected = decode_frame_block(self._audio(), [self._lane()], block, self.sample_rate,
+                                                              self.detector, profile, fec_symbols)
+            count_processed('symbols', stop_period - block.first_period)
+            self.block = next(self.blocks, None)
+            if streamed:
+                payload, ended = split_streamed_block(payload, self.header.block_size)
+                if ended:
+                    self.block = None
+            self._discard(stop + min(FRAME_RETRY_OFFSETS))
+            self.corrected += corrected
+            if attempts == 0:
+                self.failed.append(block.index)
+            elif attempts > 1:
+                self.retried.append(block.index)
+            if self.decompressor is not None:
+                try:
+                    with stage('decompression'):
+                        payload = self.decompressor.decompress(payload)
+                except (zlib.error, OSError, lzma.LZMAError, EOFError):
+                    self.decompression_error = f"Decompression failed in block {block.index}"
+                    self.done = True
+                    return
+            self.byte_count += len(payload)
+            output.append(payload)
+        self.done = True
+
+async def read_exactly(reader, size):
+    """Reads size bytes from an object with a coroutine read(n), or fewer if the stream ends first."""
+    data = b''
+    while len(data) < size:
+        chunk = await reader.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+async def read_wav_stream_header(reader):
+    """Reads a 16-bit PCM WAV header off a stream, up to the start of its samples.
+
+    Returns (sample_rate, channels, data bytes), the last None when the header leaves the length open.
+    Raises WavetransError for anything else.
+    """
+    riff = await read_exactly(reader, 12)
+    if len(riff) < 12 or riff[:4] not in (b'RIFF', b'RF64') or riff[8:] != b'WAVE':
+        raise WavetransError("Stream is not a RIFF/RF64 WAVE stream.")
+    fmt = None
+    data_size_64 = None
+    while True:
+        chunk_header = await read_exactly(reader, 8)
+        if len(chunk_header) < 8:
+            raise WavetransError("Stream ended before its WAV data chunk.")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+        if chunk_id == b'data':
+            break
+        body = await read_exactly(reader, chunk_size + chunk_size % 2)
+        if chunk_id == b'fmt ':
+            fmt = body[:chunk_size]
+        elif chunk_id == b'ds64' and len(body) >= 16:
+            data_size_64 = struct.unpack('<QQ', body[:16])[1]
+    try:
+        sample_rate, channels = parse_fmt_chunk(fmt)
+    except ValueError as e:
+        raise WavetransError(str(e))
+    if channels is None:
+        raise WavetransError("Live decoding needs 16-bit PCM audio.")
+    if chunk_size == 0xFFFFFFFF:
+        chunk_size = data_size_64
+    return sample_rate, channels, chunk_size
+
+async def decode_live(reader, write, detector='fft', profile=DEFAULT_PROFILE, max_latency=None):
+    """Decodes a WAV stream while it arrives, passing decoded bytes to write as soon as they are ready.
+
+    reader is anything with a coroutine read(n) returning b'' at the end, such as an asyncio.StreamReader
+    on a socket or pipe. Whenever no audio arrives for max_latency seconds (default: one symbol period)
+    the symbol periods already complete are decoded, so the decoder never sits on finished symbols for
+    longer than that. Returns the StreamDecoder, whose result reports on a framed stream; raises
+    WavetransError if no stream can be decoded.
+    """
+    import asyncio
+    sample_rate, channels, remaining = await read_wav_stream_header(reader)
+    decoder = StreamDecoder(sample_rate, channels, profile, detector, max_latency)
+    while not decoder.done and (remaining is None or remaining > 0):
+        size = STREAM_READ_SIZE if remaining is None else min(STREAM_READ_SIZE, remaining)
+        try:
+            with stage('read'):
+                chunk = await asyncio.wait_for(reader.read(size), max_latency or decoder.profile.symbol_duration)
+        except asyncio.TimeoutError:
+            data = decoder.flush()
+        else:
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            data = decoder.feed(chunk)
+        if data:
+            write(data)
+    data = decoder.finish()
+    if data:
+        write(data)
+    return decoder
+
+class FileStreamReader:
+    """Coroutine read(n) over a regular file, which asyncio cannot watch for readiness."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    async def read(self, size=-1):
+        return self.fileobj.read(size)
+
+async def open_sample_stream(source):
+    """Opens source for decode_live: 'tcp:HOST:PORT' connects to a socket, '-' reads stdin and other
+    paths open a pipe, FIFO or file. Returns (reader, close)."""
+    import asyncio
+    if source.startswith('tcp:'):
+        host, _, port = source[4:].rpartition(':')
+        reader, writer = await asyncio.open_connection(host or 'localhost', int(port))
+        return reader, writer.close
+    fileobj = open_path(source, 'rb')
+    if stat.S_ISREG(os.fstat(fileobj.fileno()).st_mode):
+        return FileStreamReader(fileobj), fileobj.close
+    reader = asyncio.StreamReader()
+    transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), fileobj)
+    return reader, transport.close
+
+def decode_live_source(source, output_path, detector='fft', profile=DEFAULT_PROFILE, max_latency=None):
+    """The decode --live command: decodes a socket, pipe or file as it arrives into output_path,
+    flushing every piece as soon as it is decoded. Either may be '-' for stdin or stdout."""
+    import asyncio
+
+    async def run():
+        reader, close = await open_sample_stream(source)
+        try:
+            with open_path(output_path, 'wb') as f:
+                def write(data):
+                    with stage('write'):
+                        f.write(data)
+                        f.flush()
+                    count_processed('bytes', len(data))
+                return await decode_live(reader, write, detector, profile, max_latency)
+        finally:
+            close()
+
+    with progress_output(output_path):
+        print(f"Decoding '{source}' live into '{output_path}'...")
+        try:
+            decoder = asyncio.run(run())
+        except (OSError, ValueError, WavetransError) as e:
+            print(f"Error: {e}")
+            return
+        report_framed_result(decoder.result)
+        print(f"Decoding complete! Wrote {decoder.byte_count} bytes.")
+
+def add_awgn(signal, snr_db, rng, amplitude=AMPLITUDE):
+    """Adds white Gaussian noise to a tone signal at the given per-tone SNR (dB)."""
+    noise_power = (amplitude ** 2 / 2) / (10 ** (snr_db / 10))
+    return signal + rng.normal(0., np.sqrt(noise_power), len(signal))
+
+def simulate_channel(signal, snr_db, rng, gain_db=0., dc_offset=0., drift_ppm=0., amplitude=AMPLITUDE):
+    """Passes int16 audio through a simulated line and returns what an int16 recorder would capture.
+
+    The receiver's sample clock runs drift_ppm fast (linear interpolation between the sent samples), the
+    level changes by gain_db, white noise is added at snr_db per tone (relative to amplitude after the
+    gain), a DC offset is added and the result is rounded and clipped back to int16.
+    """
+    received = signal.astype(np.float64)
+    if drift_ppm:
+        # A fast clock takes stretch samples in the time the sender took one
+        stretch = 1 + drift_ppm * 1e-6
+        positions = np.arange(int((len(received) - 1) * stretch) + 1) / stretch
+        received = np.interp(positions, np.arange(len(received)), received)
+    gain = 10 ** (gain_db / 20)
+    received = add_awgn(received * gain, snr_db, rng, amplitude * gain) + dc_offset
+    return np.clip(np.rint(received), -32768, 32767).astype(np.int16)
+
+def bit_errors(sent, received):
+    """Counts differing bits between two byte strings; bytes missing from received all count as wrong."""
+    common = min(len(sent), len(received))
+    diff = np.bitwise_xor(np.frombuffer(sent[:common], dtype=np.uint8), np.frombuffer(received[:common], dtype=np.uint8))
+    return int(np.unpackbits(diff).sum()) + 8 * (len(sent) - common)
+
+def occupied_bandwidth(signal, rate, fraction=0.99, segment=4096):
+    """Returns the width in Hz of the narrowest band around the spectrum's centre of power that holds
+    `fraction` of the signal power, from a periodogram averaged over Hann-windowed segments."""
+    segment = min(segment, len(signal))
+    usable = len(signal) // segment * segment
+    if not usable:
+        return 0.
+    frames = signal[:usable].reshape(-1, segment).astype(np.float32) * np.hanning(segment).astype(np.float32)
+    power = (np.abs(np.fft.rfft(frames, axis=1)) ** 2).mean(axis=0)
+    cumulative = np.cumsum(power) / power.sum()
+    tail = (1. - fraction) / 2
+    low, high = np.searchsorted(cumulative, (tail, 1. - tail))
+    return (high - low) * rate / segment
+
+def benchmark_sweep(num_bytes, durations, spacings, snrs, gain_db=0., dc_offset=0., drift_ppm=0., seed=0,
+                    syntheses=SYNTHESIS_MODES, edge_ramp=0.):
+    """Sends random bytes through the channel simulator for every symbol duration, tone spacing,
+    synthesis mode, SNR and detector, and reports air rate, the data symbols' 99% occupied bandwidth,
+    encode and decode throughput and bit error rate.
+
+    A spacing of 0 means one FFT bin of the symbol window. Decoding covers the sync search as well as
+    demodulation. Like a real recording, the simulated one runs on for a symbol after the signal ends, so
+    a sync estimate a few samples late does not cost the last symbol.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.bytes(num_bytes)
+    print(f"{'duration s':>10}{'spacing Hz':>12}  {'synthesis':<10}{'SNR dB':>8}  {'detector':<12}{'air B/s':>9}"
+          f"{'BW99 Hz':>9}{'encode B/s':>12}{'decode B/s':>12}{'BER':>11}")
+    for duration in durations:
+        for spacing in spacings:
+            try:
+                profile = ModemProfile(symbol_duration=duration, tone_spacing=spacing or None)
+            except ValueError as e:
+                print(f"{duration:>10g}{spacing:>12g}  skipped: {e}")
+                continue
+            for synthesis in syntheses:
+                start = time.perf_counter()
+                signal = modulate_bytes(data, profile, synthesis, edge_ramp)
+                encode_time = time.perf_counter() - start
+                recording = np.concatenate((signal, np.zeros(profile.samples_per_symbol, dtype=np.int16)))
+                num_symbols = profile.symbols_for_bytes(num_bytes)
+                air_rate = num_bytes / (len(signal) / profile.sample_rate)
+                bandwidth = occupied_bandwidth(signal[len(profile.sync_tone):], profile.sample_rate)
+                for snr_db in snrs:
+                    received = simulate_channel(recording, snr_db, rng, gain_db, dc_offset, drift_ppm,
+                                                profile.amplitude)
+                    # Untimed warm-up, so no detector's figures include building the cached sync
+                    # carrier and tone tables
+                    warm_start = max(find_sync(received, profile.sample_rate, profile), 0)
+                    for detector in DETECTORS:
+                        demodulate_range(received, warm_start, 1, profile.sample_rate, detector, profile)
+                    for detector in DETECTORS:
+                        start = time.perf_counter()
+                        start_index = find_sync(received, profile.sample_rate, profile)
+                        decoded = b''
+                        if start_index >= 0:
+                            available = (len(received) - start_index) // profile.samples_per_symbol
+                            values = demodulate_range(received, start_index, min(num_symbols, available),
+                                                      profile.sample_rate, detector, profile)
+                            decoded = symbols_to_bytes(values.reshape(-1),
+                                                       profile.bits_per_symbol)[:num_bytes].tobytes()
+                        decode_time = time.perf_counter() - start
+                        ber = bit_errors(data, decoded) / (8 * num_bytes)
+                        print(f"{duration:>10g}{profile.tone_spacing:>12.1f}  {synthesis:<10}{snr_db:>8.1f}  "
+                              f"{detector:<12}{air_rate:>9.1f}{bandwidth:>9.0f}{num_bytes / encode_time:>12.0f}"
+                              f"{num_bytes / decode_time:>12.0f}{ber:>11.2e}")
+
+def benchmark_detectors(num_symbols, snrs, profile=DEFAULT_PROFILE, seed=0):
+    """Times each detector on random symbols and reports symbol error rate per SNR."""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, profile.num_tones, (num_symbols, profile.carriers), dtype=np.uint8)
+    clean = synthesize_periods(values, profile, np.empty((num_symbols, profile.samples_per_symbol), dtype=np.int16))
+    print(f"{'detector':<12}{'SNR dB':>8}{'symbols/s':>14}{'SER':>12}")
+    for snr_db in snrs:
+        noisy = add_awgn(clean.reshape(-1), snr_db, rng, profile.tone_amplitude)
+        for name, demodulate in DETECTORS.items():
+            start = time.perf_counter()
+            decoded = demodulate(noisy, profile.sample_rate, profile)
+            elapsed = time.perf_counter() - start
+            ser = np.count_nonzero(decoded != values) / values.size
+            print(f"{name:<12}{snr_db:>8.1f}{num_symbols / elapsed:>14.0f}{ser:>12.2e}")
+
+def benchmark_sync(trials, snrs, symbol_duration=SYMBOL_DURATION, tone_spacing=None, carriers=1,
+                   bit_widths=SYNC_BENCH_BITS, seed=0):
+    """Encodes random payloads after a random stretch of silence for every alphabet width (with the tone
+    plan encode --bits would use) and SNR, and reports how far find_sync lands from the true end of the
+    sync header and how long it takes.
+
+    The clean rows should be exact: a sync a few samples late costs the last symbol period of a
+    recording that ends with the signal.
+    """
+    rng = np.random.default_rng(seed)
+    print(f"{'bits':>5}{'sync Hz':>10}{'SNR dB':>8}{'exact':>8}{'max error':>11}{'mean error':>12}{'ms':>8}")
+    for bits in bit_widths:
+        try:
+            width_profile = ModemProfile(bits_per_symbol=bits, symbol_duration=symbol_duration,
+                                         tone_spacing=tone_spacing, carriers=carriers)
+        except ValueError as e:
+            print(f"{bits:>5}  skipped: {e}")
+            continue
+        for snr_db in [None] + list(snrs):
+            errors, elapsed = [], 0.
+            for _ in range(trials):
+                lead = int(rng.integers(0, width_profile.samples_per_sync_header))
+                signal = modulate_bytes(rng.bytes(SYNC_BENCH_BYTES), width_profile)
+                recording = np.concatenate((np.zeros(lead, dtype=np.int16), signal))
+                if snr_db is not None:
+                    recording = simulate_channel(recording, snr_db, rng, amplitude=width_profile.amplitude)
+                # Untimed first search builds the cached sync carrier for this length
+                find_sync(recording, width_profile.sample_rate, width_profile)
+                start = time.perf_counter()
+                found = find_sync(recording, width_profile.sample_rate, width_profile)
+                elapsed += time.perf_counter() - start
+                errors.append(abs(found - lead - len(width_profile.sync_tone)) if found >= 0 else np.inf)
+            label = 'clean' if snr_db is None else f'{snr_db:.1f}'
+            print(f"{bits:>5}{width_profile.sync_frequency:>10.0f}{label:>8}{errors.count(0) / trials:>8.0%}"
+                  f"{max(errors):>11g}{np.mean(errors):>12.2f}{elapsed / trials * 1000:>8.1f}")
+
+def benchmark_startup(runs=5):
+    """Times fresh interpreter processes: bare start-up, the imports this tool depends on, and the CLI
+    encoding and decoding a STARTUP_BENCH_BYTES payload.
+
+    The encode time bounds the time to the first sample on disk, as the sync header is written before
+    anything else. Reports the fastest and the median of runs.
+    """
+    import subprocess
+    import tempfile
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as scratch:
+        payload, audio, decoded = (os.path.join(scratch, name) for name in ('payload.bin', 'audio.wav', 'decoded.bin'))
+        with open(payload, 'wb') as f:
+            f.write(os.urandom(STARTUP_BENCH_BYTES))
+        stages = [
+            ('interpreter', ['-c', 'pass']),
+            ('import numpy', ['-c', 'import numpy']),
+            ('import scipy.io.wavfile', ['-c', 'import scipy.io.wavfile']),
+            ('import wavetrans', ['-c', f'import sys; sys.path.insert(0, {here!r}); import wavetrans']),
+            (f'encode {STARTUP_BENCH_BYTES} B', [os.path.join(here, 'wavetrans.py'), 'encode', payload, audio]),
+            (f'decode {STARTUP_BENCH_BYTES} B', [os.path.join(here, 'wavetrans.py'), 'decode', audio, decoded]),
+        ]
+        print(f"{'stage':<26}{'min ms':>10}{'median ms':>12}")
+        for name, arguments in stages:
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                completed = subprocess.run([sys.executable] + arguments, stdout=subprocess.DEVNULL,
+                                           stderr=subprocess.DEVNULL)
+                times.append(time.perf_counter() - start)
+                if completed.returncode:
+                    break
+            if completed.returncode:
+                print(f"{name:<26}  failed (exit status {completed.returncode})")
+                continue
+            print(f"{name:<26}{min(times) * 1000:>10.1f}{np.median(times) * 1000:>12.1f}")
+
+def benchmark_fec(num_bytes, parities, block_size=FRAME_BLOCK_SIZE, seed=0):
+    """Times Reed-Solomon encoding and decoding of block_size-byte frame blocks, clean and with nsym // 4
+    random byte errors in every codeword, half of what it can correct."""
+    rng = np.random.default_rng(seed)
+    blocks = [rng.integers(0, 256, block_size, dtype=np.uint8).tobytes()
+              for _ in range(max(num_bytes // block_size, 1))]
+    total = len(blocks) * block_size
+    print(f"{'parity':>8}{'overhead':>10}{'encode MB/s':>14}{'decode MB/s':>14}{'noisy MB/s':>13}{'recovered':>11}")
+    for nsym in parities:
+        start = time.perf_counter()
+        coded = [rs_encode(block, nsym) for block in blocks]
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for block in coded:
+            rs_decode(block, block_size, nsym)
+        decode_time = time.perf_counter() - start
+
+        # Where each codeword's transmitted bytes sit in the interleaved block
+        mask = rs_layout(block_size, nsym)
+        offsets = np.full(mask.shape, -1)
+        offsets.T[mask.T] = np.arange(np.count_nonzero(mask))
+        noisy = []
+        for block in coded:
+            corrupted = np.frombuffer(block, dtype=np.uint8).copy()
+            positions = np.concatenate([rng.choice(row[row >= 0], nsym // 4, replace=False) for row in offsets])
+            corrupted[positions] ^= rng.integers(1, 256, len(positions), dtype=np.uint8)
+            noisy.append(corrupted.tobytes())
+        start = time.perf_counter()
+        decoded = [rs_decode(block, block_size, nsym)[0] for block in noisy]
+        noisy_time = time.perf_counter() - start
+        recovered = sum(a == b for a, b in zip(decoded, blocks)) / len(blocks)
+        overhead = len(coded[0]) / block_size - 1
+        print(f"{nsym:>8}{overhead:>10.1%}{total / encode_time / 1e6:>14.2f}{total / decode_time / 1e6:>14.2f}"
+              f"{total / noisy_time / 1e6:>13.2f}{recovered:>11.0%}")
+
+def calibration_durations(min_duration, max_duration, steps):
+    """Geometric ladder of candidate symbol durations, rounded to 0.1 ms, shortest first."""
+    return sorted({round(float(d), 4) for d in np.geomspace(min_duration, max_duration, steps)})
+
+def calibration_profile(base, duration, factor):
+    """The candidate profile with the given symbol duration and a tone spacing of factor FFT bins,
+    or None if its tones do not fit below the Nyquist frequency."""
+    bin_width = base.sample_rate / int(base.sample_rate * duration)
+    try:
+        return dataclasses.replace(base, symbol_duration=duration, tone_spacing=factor * bin_width)
+    except ValueError:
+        return None
+
+def probe_payload(index, num_symbols, profile):
+    """The seeded random bytes that probe section index carries (num_symbols periods' worth)."""
+    return np.random.default_rng(CALIBRATION_SEED + index).bytes(num_symbols * profile.bits_per_period // 8)
+
+def probe_sections(base, durations, num_symbols):
+    """Lays out a probe recording: yields (index, profile, start sample, signal) for every candidate
+    duration and spacing factor whose tones fit the sample rate."""
+    candidates = [(duration, factor) for duration in durations for factor in CALIBRATION_SPACING_FACTORS]
+    gap = int(CALIBRATION_GAP * base.sample_rate)
+    start = 0
+    for index, (duration, factor) in enumerate(candidates):
+        profile = calibration_profile(base, duration, factor)
+        if profile is None:
+            continue
+        signal = modulate_bytes(probe_payload(index, num_symbols, profile), profile)
+        yield index, profile, start, signal
+        start += len(signal) + gap
+
+def write_probe(output_path, base, durations, num_symbols):
+    """Writes the probe sequence to play through the channel to be calibrated."""
+    gap = np.zeros(int(CALIBRATION_GAP * base.sample_rate), dtype=np.int16)
+    with open(output_path, 'wb') as out:
+        writer = WavWriter(out, base.sample_rate)
+        writer.write(gap)
+        for _, _, _, signal in probe_sections(base, durations, num_symbols):
+            writer.write(signal)
+            writer.write(gap)
+        writer.close()
+    print(f"Wrote probe to '{output_path}' ({writer.data_bytes / 2 / base.sample_rate:.1f} s). Play it through the "
+          f"channel, record it and run calibrate again with --recording and the same options.")
+
+def symbol_error_rate(received, data, profile, detector='fft'):
+    """Fraction of the symbols carrying data that are misdetected in received (sync header included).
+    Symbols missing from the recording count as errors."""
+    sent = bytes_to_periods(data, profile)
+    start_index = find_sync(received, profile.sample_rate, profile)
+    if start_index < 0:
+        return 1.
+    available = (len(received) - start_index) // profile.samples_per_symbol
+    values = demodulate_range(received, start_index, min(len(sent), available), profile.sample_rate,
+                              detector, profile)
+    errors = np.count_nonzero(values != sent[:len(values)]) + (len(sent) - len(values)) * profile.carriers
+    return errors / sent.size
+
+def simulated_channel_meter(num_symbols, snr_db, gain_db=0., dc_offset=0., drift_ppm=0., detector='fft', seed=0):
+    """Returns a function measuring a candidate profile's symbol error rate over the channel simulator."""
+    rng = np.random.default_rng(seed)
+
+    def measure(profile):
+        data = rng.bytes(num_symbols * profile.bits_per_period // 8)
+        signal = modulate_bytes(data, profile)
+        recording = np.concatenate((signal, np.zeros(profile.samples_per_symbol, dtype=np.int16)))
+        received = simulate_channel(recording, snr_db, rng, gain_db, dc_offset, drift_ppm, profile.amplitude)
+        return symbol_error_rate(received, data, profile, detector)
+    return measure
+
+def recording_meter(audio_data, base, durations, num_symbols, detector='fft'):
+    """Returns a function measuring a candidate profile's symbol error rate from a recorded probe.
+
+    Sections are found in probe order; each sync found re-anchors where the next one is expected, which
+    absorbs playback latency and clock drift.
+    """
+    audio_data = downmix(audio_data)
+    margin = int(CALIBRATION_SEARCH_MARGIN * base.sample_rate)
+    leading_gap = int(CALIBRATION_GAP * base.sample_rate)
+    offset = None
+    rates = {}
+    for index, profile, start, signal in probe_sections(base, durations, num_symbols):
+        if offset is None:
+            search_start = 0
+            window = audio_data
+        else:
+            search_start = max(leading_gap + start + offset - margin, 0)
+            window = audio_data[search_start:search_start + len(signal) + 2 * margin]
+        found = find_sync(window, profile.sample_rate, profile)
+        if found < 0:
+            rates[profile] = 1.
+            continue
+        section_start = found - len(profile.sync_tone)
+        offset = search_start + section_start - leading_gap - start
+        section = window[section_start:section_start + len(signal) + profile.samples_per_symbol]
+        rates[profile] = symbol_error_rate(section, probe_payload(index, num_symbols, profile), profile, detector)
+
+    def measure(profile):
+        return rates.get(profile, 1.)
+    return measure
+
+def calibrate(base, durations, measure, target_ser):
+    """Binary-searches the shortest symbol duration, and for it the tightest tone spacing, whose measured
+    symbol error rate is at most target_ser.
+
+    Error rate is assumed to fall as durations and spacings grow. Returns (profile, rate) or None if even
+    the longest duration at the widest spacing misses the target.
+    """
+    if not durations:
+        raise ValueError("No candidate symbol durations to calibrate.")
+
+    def tightest_spacing(duration):
+        low, high, best = 0, len(CALIBRATION_SPACING_FACTORS) - 1, None
+        while low <= high:
+            middle = (low + high) // 2
+            profile = calibration_profile(base, duration, CALIBRATION_SPACING_FACTORS[middle])
+            rate = measure(profile) if profile is not None else None
+            if profile is not None:
+                print(f"  {duration * 1000:7.1f} ms  {profile.tone_spacing:8.1f} Hz  SER {rate:.2e}")
+            if rate is not None and rate <= target_ser:
+                best, high = (profile, rate), middle - 1
+            else:
+                low = middle + 1
+        return best
+
+    best = tightest_spacing(durations[-1])
+    if best is None:
+        return None
+    low, high = 0, len(durations) - 2
+    while low <= high:
+        middle = (low + high) // 2
+        result = tightest_spacing(durations[middle])
+        if result is not None:
+            best, high = result, middle - 1
+        else:
+            low = middle + 1
+    return best
+
+def profile_path(name):
+    """Path of a saved modem profile; a name containing a path separator or ending in .json is a path."""
+    if name.endswith('.json') or os.sep in name:
+        return name
+    return os.path.join(PROFILE_DIR, name + '.json')
+
+def save_profile(name, profile, calibration):
+    path = profile_path(name)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    saved = dataclasses.asdict(profile)
+    del saved['source_rate'] # Only set on profiles made for demodulating off-rate audio
+    with open(path, 'w') as f:
+        json.dump(dict(saved, calibration=calibration), f, indent=2)
+    return path
+
+def load_profile(name):
+    """Loads a modem profile saved by calibrate; raises ValueError if it is missing or malformed."""
+    path = profile_path(name)
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+        return ModemProfile(**{field.name: saved[field.name] for field in dataclasses.fields(ModemProfile)
+                                if field.name != 'source_rate'})
+    except FileNotFoundError:
+        raise ValueError(f"Modem profile '{name}' not found at '{path}'.")
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Modem profile '{path}' is malformed ({e}).")
+
+def run_calibration(name, base, durations, num_symbols, target_ser, detector='fft', recording=None,
+                    probe_output=None, snr_db=0., gain_db=0., dc_offset=0., drift_ppm=0.):
+    """The calibrate command: writes a probe, or measures a recorded probe or the simulated channel,
+    and saves the fastest profile meeting target_ser under name."""
+    if probe_output:
+        write_probe(probe_output, base, durations, num_symbols)
+        return
+    if recording:
+        try:
+            rate, audio_data = read_wav(recording, memory_map=True)
+        except FileNotFoundError:
+            print(f"Error: Recording not found at '{recording}'")
+            return
+        if rate != base.sample_rate:
+            print(f"Error: Recording is {rate} Hz but the probe was {base.sample_rate} Hz.")
+            return
+        print(f"Measuring probe sections in '{recording}'...")
+        measure = recording_meter(audio_data, base, durations, num_symbols, detector)
+        channel = {'recording': os.path.abspath(recording)}
+    else:
+        print(f"Calibrating against the simulated channel at {snr_db:g} dB SNR...")
+        measure = simulated_channel_meter(num_symbols, snr_db, gain_db, dc_offset, drift_ppm, detector)
+        channel = {'snr_db': snr_db, 'gain_db': gain_db, 'dc_offset': dc_offset, 'drift_ppm': drift_ppm}
+
+    result = calibrate(base, durations, measure, target_ser)
+    if result is None:
+        print(f"Error: No candidate reached a symbol error rate of {target_ser:g}; even "
+              f"{durations[-1] * 1000:.1f} ms symbols are too short for this channel.")
+        return
+    profile, rate = result
+    path = save_profile(name, profile, dict(channel, detector=detector, target_ser=target_ser, measured_ser=rate))
+    air_rate = profile.bits_per_period / 8 / profile.symbol_duration
+    print(f"Calibrated: {profile.symbol_duration * 1000:.1f} ms symbols, {profile.tone_spacing:.1f} Hz spacing, "
+          f"SER {rate:.2e}, {air_rate:.1f} B/s. Saved to '{path}'; use --modem-profile {name} "
+          f"with --detector {detector}.")
+
+def batch_pairs(command, paths, manifest=None, input_dir=None, output_dir=None):
+    """Collects the (input, output) path pairs of a batch.
+
+    paths alternate inputs and outputs. Every non-blank, non-comment line of a manifest holds an input
+    and an output path, tab-separated (or separated by spaces if neither contains one). Every file in
+    input_dir is encoded to output_dir/<name>.wav, and every .wav file decoded to output_dir/<name>
+    without the extension, so a directory round-trips to the original names.
+    """
+    if len(paths) % 2:
+        raise ValueError("Paths must come in INPUT OUTPUT pairs.")
+    pairs = list(zip(paths[0::2], paths[1::2]))
+    if manifest:
+        with open(manifest) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = line.split('\t') if '\t' in line else line.split()
+                if len(fields) != 2:
+                    raise ValueError(f"{manifest}:{number}: expected an input and an output path.")
+                pairs.append(tuple(fields))
+    if bool(input_dir) != bool(output_dir):
+        raise ValueError("--input-dir and --output-dir go together.")
+    if input_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for name in sorted(os.listdir(input_dir)):
+            path = os.path.join(input_dir, name)
+            stem, extension = os.path.splitext(name)
+            if not os.path.isfile(path) or command == 'decode' and extension.lower() != '.wav':
+                continue
+            pairs.append((path, os.path.join(output_dir, name + '.wav' if command == 'encode' else stem)))
+    return pairs
+
+def _run_batch_job(command, input_path, output_path, options):
+    """Pool task: quietly encodes or decodes one file of a batch and returns its summary record."""
+    record = {'input': input_path, 'output': output_path}
+    start = time.perf_counter()
+    try:
+        if command == 'encode':
+            record['audio_seconds'] = encode_file(input_path, output_path, **options)
+            record['bytes'] = os.path.getsize(input_path)
+        else:
+            record['bytes'], result = decode_file(input_path, output_path, **options)
+            if result is not None:
+                record.update(corrected=result.corrected, retried_blocks=result.retried, failed_blocks=result.failed)
+                if result.failed:
+                    record['error'] = f"{len(result.failed)} block(s) failed their CRC."
+                if result.decompression_error:
+                    record['error'] = f"{result.decompression_error}."
+    except (OSError, ValueError, WavetransError) as e:
+        record['error'] = str(e)
+    record['ok'] = 'error' not in record
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+def run_batch(command, pairs, options, jobs=None, summary_path=None):
+    """Encodes or decodes every (input, output) pair in a pool of jobs processes (default: one per CPU).
+
+    The processes start once, so the interpreter and NumPy/SciPy imports are paid once per process rather
+    than once per file. Writes a JSON summary with every file's outcome and timing to summary_path, or
+    prints it if that is None or '-'. Returns the number of files that failed.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = jobs or os.cpu_count()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(jobs) as pool:
+        inputs, outputs = zip(*pairs)
+        records = list(pool.map(_run_batch_job, itertools.repeat(command), inputs, outputs, itertools.repeat(options),
+                                chunksize=max(1, len(pairs) // (4 * jobs))))
+    failed = sum(not record['ok'] for record in records)
+    elapsed = time.perf_counter() - start
+    summary = {'command': command, 'jobs': jobs, 'files': len(records), 'succeeded': len(records) - failed,
+               'failed': failed, 'seconds': elapsed, 'results': records}
+    if summary_path in (None, '-'):
+        print(json.dumps(summary, indent=2))
+    else:
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Batch {command}: {len(records) - failed} of {len(records)} file(s) succeeded in {elapsed:.2f} s. "
+              f"Summary written to '{summary_path}'.")
+    return failed
+
+def print_stats(summary):
+    """Prints a StageStats summary as a table of stages followed by throughput and peak memory."""
+    wall = summary['wall_seconds']
+    print(f"{'stage':<16}{'wall s':>10}{'CPU s':>10}{'calls':>9}{'% wall':>9}")
+    for name, entry in summary['stages'].items():
+        share = 100 * entry['wall_seconds'] / wall if wall else 0.
+        print(f"{name:<16}{entry['wall_seconds']:>10.3f}{entry['cpu_seconds']:>10.3f}{entry['calls']:>9}{share:>8.1f}%")
+    print(f"{'total':<16}{wall:>10.3f}{summary['cpu_seconds']:>10.3f}")
+    if summary['worker_cpu_seconds']:
+        print(f"Worker processes used {summary['worker_cpu_seconds']:.3f} s of CPU.")
+    print(f"Throughput: {summary['symbols']} symbols at {summary['symbols_per_second']:.0f} symbols/s, "
+          f"{summary['bytes']} bytes at {summary['bytes_per_second']:.0f} B/s.")
+    if summary['peak_rss_bytes'] is not None:
+        workers = summary['worker_peak_rss_bytes']
+        print(f"Peak RSS: {summary['peak_rss_bytes'] / 2**20:.1f} MiB"
+              + (f" (largest worker: {workers / 2**20:.1f} MiB)." if workers else "."))
+
+def run_with_stats(run, command, input_path, output_path, show=False, json_path=None):
+    """Calls run() while collecting StageStats, then prints them if show and writes them as JSON to
+    json_path if given (encode/decode --profile and --stats-json)."""
+    global _stats
+    _stats = StageStats()
+    try:
+        run()
+    finally:
+        stats, _stats = _stats, None
+    summary = stats.summary(command, input_path, output_path)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if show:
+        with progress_output(output_path):
+            print_stats(summary)
+
+def add_stats_arguments(parser):
+    """Adds the options reporting per-stage timing, throughput and peak memory."""
+    parser.add_argument("--profile", dest="show_stats", action="store_true",
+                        help="Print wall and CPU time per pipeline stage, symbols and bytes per second and "
+                             "peak RSS when done.")
+    parser.add_argument("--stats-json", metavar="FILE",
+                        help="Write the same statistics as JSON to FILE, e.g. to track throughput in CI.")
+
+def add_batch_arguments(parser, command):
+    """Adds the options that turn encode or decode into a batch run over many files."""
+    source, target = ("file", ".wav file") if command == "encode" else (".wav file", "reconstructed file")
+    parser.add_argument("paths", nargs="*", metavar="INPUT OUTPUT",
+                        help=f"Path to the input {source} and path for the output {target}, either of "
+                             "which may be '-' for stdin or stdout; more pairs, --manifest or --input-dir "
+                             "make a batch.")
+    parser.add_argument("--manifest", metavar="FILE",
+                        help="Batch: a file listing an input and an output path per line (tab-separated).")
+    parser.add_argument("--input-dir", metavar="DIR", help=f"Batch: {command} every {source} in DIR.")
+    parser.add_argument("--output-dir", metavar="DIR",
+                        help="Batch: where the --input-dir outputs go, "
+                             + ("as <name>.wav." if command == "encode" else "named without the .wav extension."))
+    parser.add_argument("--jobs", type=int, help="Batch: worker processes (default: one per CPU).")
+    parser.add_argument("--summary", metavar="JSON",
+                        help="Batch: write the JSON summary of every file's outcome and timing here "
+                             "(default: print it). Also turns a single pair into a batch.")
+
+def add_profile_arguments(parser):
+    """Adds the tone-plan options; encoder and decoder must be given the same ones."""
+    parser.add_argument("--bits", type=int, choices=range(4, 9), metavar="{4..8}",
+                        help="Bits per symbol, i.e. an alphabet of 2**BITS tones spaced one FFT bin apart "
+                             "(default: the original 16 tones at 150 Hz).")
+    parser.add_argument("--tone-spacing", type=float, help="Override the tone spacing in Hz.")
+    parser.add_argument("--symbol-duration", type=float,
+                        help=f"Seconds per symbol (default: {SYMBOL_DURATION}); shorter is faster but less robust.")
+    parser.add_argument("--carriers", type=int,
+                        help="Send this many tones at once in disjoint sub-bands, multiplying bits per symbol.")
+    parser.add_argument("--modem-profile", metavar="NAME",
+                        help="Use a profile saved by calibrate (a name under ~/.wavetrans/profiles, or a .json path) "
+                             "instead of the options above.")
+
+def profile_from_args(args):
+    if args.modem_profile:
+        if any(value is not None for value in (args.bits, args.tone_spacing, args.carriers, args.symbol_duration)):
+            raise ValueError("--modem-profile cannot be combined with the other tone-plan options.")
+        return load_profile(args.modem_profile)
+    if args.bits is None and args.tone_spacing is None and args.carriers is None and args.symbol_duration is None:
+        return DEFAULT_PROFILE
+    return ModemProfile(bits_per_symbol=4 if args.bits is None else args.bits,
+                        symbol_duration=SYMBOL_DURATION if args.symbol_duration is None else args.symbol_duration,
+                        tone_spacing=args.tone_spacing, carriers=1 if args.carriers is None else args.carriers)
 
 def main():
     parser = argparse.ArgumentParser(description="Encode/Decode files to/from high-density MFSK WAV audio.")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     encode_parser = subparsers.add_parser("encode", help="Encode a file to a .wav file.")
-    encode_parser.add_argument("input", type=str, help="Path to the input file.")
-    encode_parser.add_argument("output", type=str, help="Path for the output .wav file.")
+    add_batch_arguments(encode_parser, "encode")
+    encode_parser.add_argument("--channels", type=int, default=1,
+                               help="Write a multichannel WAV with every channel an independent data lane.")
+    encode_parser.add_argument("--framed", action="store_true",
+                               help="Use the framed format: a length header, then blocks each with a CRC32, "
+                                    "so the decoder stops at the payload end and can retry damaged blocks.")
+    encode_parser.add_argument("--block-size", type=int, default=FRAME_BLOCK_SIZE,
+                               help=f"Payload bytes per framed block (default: {FRAME_BLOCK_SIZE}).")
+    encode_parser.add_argument("--describe", action="store_true",
+                               help="Start the stream with a preamble describing its tone plan, framing, "
+                                    "compression and FEC, so it decodes without any options.")
+    encode_parser.add_argument("--compress", choices=["none", "auto"] + list(CODECS), default="none",
+                               help="Compress the input before modulating it; 'auto' picks the codec that does "
+                                    "best on samples of the input (implies --framed).")
+    encode_parser.add_argument("--fec", type=int, default=0, metavar="NSYM",
+                               help="Add NSYM Reed-Solomon parity bytes per 255-byte codeword, correcting up to "
+                                    "NSYM/2 byte errors in each (implies --framed).")
+    encode_parser.add_argument("--synthesis", choices=SYNTHESIS_MODES, default="reset",
+                               help="Start every symbol's tones at phase zero, or keep each carrier's phase "
+                                    "continuous across symbols for a narrower spectrum (default: reset).")
+    encode_parser.add_argument("--edge-ramp", type=float, default=0., metavar="FRACTION",
+                               help="Taper the first and last FRACTION of every symbol with a raised cosine "
+                                    f"(0 to {MAX_EDGE_RAMP}) to cut the splatter of abrupt symbol edges.")
+    add_stats_arguments(encode_parser)
+    add_profile_arguments(encode_parser)
 
     decode_parser = subparsers.add_parser("decode", help="Decode a .wav file back to a file.")
-    decode_parser.add_argument("input", type=str, help="Path to the input .wav file.")
-    decode_parser.add_argument("output", type=str, help="Path for the reconstructed output file.")
+    add_batch_arguments(decode_parser, "decode")
+    decode_parser.add_argument("--detector", choices=sorted(DETECTORS), default="fft",
+                               help="Symbol detector: full-spectrum FFT peak, energy at the alphabet's tones only, "
+                                    "or an FFT peak interpolated between bins (for spacings under one bin).")
+    decode_parser.add_argument("--workers", type=int,
+                               help="Processes demodulating symbol ranges in parallel "
+                                    "(default: one per lane, i.e. 1 without --lanes).")
+    decode_parser.add_argument("--lanes", action="store_true",
+                               help="Decode each WAV channel as an independent lane (see encode --channels) "
+                                    "instead of down-mixing.")
+    decode_parser.add_argument("--live", action="store_true",
+                               help="Decode the input as it arrives and write each piece as soon as it is decoded; "
+                                    "the input may be a pipe, FIFO, file or tcp:HOST:PORT socket.")
+    decode_parser.add_argument("--max-latency", type=float, metavar="SECONDS",
+                               help="With --live, the longest decoded audio may wait before its bytes are "
+                                    "written (default: one symbol period).")
+    add_stats_arguments(decode_parser)
+    add_profile_arguments(decode_parser)
+
+    bench_parser = subparsers.add_parser("bench", help="Benchmark the symbol detectors on synthetic noisy audio, "
+                                                       "the Reed-Solomon FEC, the modem over a simulated channel, "
+                                                       "the sync search, or CLI start-up.")
+    bench_parser.add_argument("target", nargs="?", choices=["detectors", "fec", "sweep", "startup", "sync"],
+                              default="detectors",
+                              help="What to benchmark (default: detectors). 'sweep' encodes and decodes through "
+                                   "the channel simulator for every symbol duration, tone spacing, synthesis mode, "
+                                   "SNR and detector; 'startup' times fresh CLI processes; 'sync' "
+                                   "measures the sync search's error for every alphabet width from 4 to 8 bits.")
+    bench_parser.add_argument("--symbols", type=int, default=20000, help="Number of random symbols per run.")
+    bench_parser.add_argument("--runs", type=int, default=5, help="Processes started per stage for startup.")
+    bench_parser.add_argument("--trials", type=int, default=20, help="Random payloads per alphabet width and SNR for sync.")
+    bench_parser.add_argument("--snr", type=float, nargs="+", default=[-15., -12., -10., 0.],
+                              help="Per-tone SNR values in dB.")
+    bench_parser.add_argument("--bytes", type=int,
+                              help="Payload bytes per run (default: 1 MiB for fec, 2000 for sweep).")
+    bench_parser.add_argument("--fec", type=int, nargs="+", default=[8, 16, 32, 64], metavar="NSYM",
+                              help="Parity bytes per codeword to benchmark.")
+    bench_parser.add_argument("--durations", type=float, nargs="+", default=[0.03, 0.02, 0.01, 0.005],
+                              help="Symbol durations in seconds to sweep.")
+    bench_parser.add_argument("--spacings", type=float, nargs="+", default=[float(FREQUENCY_STEP), 0.],
+                              help="Tone spacings in Hz to sweep; 0 means one FFT bin of the symbol window.")
+    bench_parser.add_argument("--gain-db", type=float, default=-6., help="Channel gain in dB for sweep.")
+    bench_parser.add_argument("--dc-offset", type=float, default=100., help="Channel DC offset in sample units.")
+    bench_parser.add_argument("--drift-ppm", type=float, default=0.,
+                              help="Receiver sample clock error in parts per million; positive runs fast.")
+    bench_parser.add_argument("--synthesis", choices=SYNTHESIS_MODES, nargs="+", default=list(SYNTHESIS_MODES),
+                              help="Synthesis modes to sweep.")
+    bench_parser.add_argument("--edge-ramp", type=float, default=0., metavar="FRACTION",
+                              help="Symbol edge taper for sweep (see encode --edge-ramp).")
+    add_profile_arguments(bench_parser)
+
+    calibrate_parser = subparsers.add_parser(
+        "calibrate", help="Find the shortest symbol duration and tightest tone spacing that meet a target "
+                          "symbol error rate, and save them as a named profile.")
+    calibrate_parser.add_argument("name", help="Profile name (saved under ~/.wavetrans/profiles) or .json path.")
+    calibrate_parser.add_argument("--target-ser", type=float, default=1e-3, help="Highest acceptable symbol error rate.")
+    calibrate_parser.add_argument("--detector", choices=sorted(DETECTORS), default="fft",
+                                  help="Detector the profile will be decoded with.")
+    calibrate_parser.add_argument("--bits", type=int, choices=range(4, 9), default=4, metavar="{4..8}",
+                                  help="Bits per symbol of the calibrated profile.")
+    calibrate_parser.add_argument("--carriers", type=int, default=1, help="Carriers of the calibrated profile.")
+    calibrate_parser.add_argument("--min-duration", type=float, default=0.002, help="Shortest symbol duration tried.")
+    calibrate_parser.add_argument("--max-duration", type=float, default=0.06, help="Longest symbol duration tried.")
+    calibrate_parser.add_argument("--steps", type=int, default=12, help="Candidate durations between the two.")
+    calibrate_parser.add_argument("--symbols", type=int, default=2000,
+                                  help="Symbols measured per candidate (and per probe section).")
+    calibrate_parser.add_argument("--probe-out", metavar="WAV",
+                                  help="Only write the probe sequence to play through the real channel.")
+    calibrate_parser.add_argument("--recording", metavar="WAV",
+                                  help="Measure a recording of the probe instead of the simulated channel.")
+    calibrate_parser.add_argument("--snr", type=float, default=0., help="Simulated channel per-tone SNR in dB.")
+    calibrate_parser.add_argument("--gain-db", type=float, default=0., help="Simulated channel gain in dB.")
+    calibrate_parser.add_argument("--dc-offset", type=float, default=0., help="Simulated channel DC offset.")
+    calibrate_parser.add_argument("--drift-ppm", type=float, default=0., help="Simulated receiver clock error in ppm; positive runs fast.")
 
     args = parser.parse_args()
 
+    if args.command == "calibrate":
+        if args.steps < 1:
+            parser.error("--steps must be at least 1.")
+        if not 0 < args.min_duration <= args.max_duration:
+            parser.error("--min-duration must be positive and at most --max-duration.")
+        try:
+            base = ModemProfile(bits_per_symbol=args.bits, carriers=args.carriers)
+        except ValueError as e:
+            parser.error(str(e))
+        durations = calibration_durations(args.min_duration, args.max_duration, args.steps)
+        run_calibration(args.name, base, durations, args.symbols, args.target_ser, args.detector, args.recording,
+                        args.probe_out, args.snr, args.gain_db, args.dc_offset, args.drift_ppm)
+        return
+
+    try:
+        profile = profile_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command in ("encode", "bench") and not 0 <= args.edge_ramp <= MAX_EDGE_RAMP:
+        parser.error(f"--edge-ramp must be between 0 and {MAX_EDGE_RAMP}.")
+    pairs = None
+    if args.command in ("encode", "decode") and (args.manifest or args.input_dir or args.output_dir
+                                                 or args.summary or len(args.paths) != 2):
+        if args.jobs is not None and args.jobs < 1:
+            parser.error("--jobs must be at least 1.")
+        try:
+            pairs = batch_pairs(args.command, args.paths, args.manifest, args.input_dir, args.output_dir)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if not pairs:
+            parser.error("No input files to process.")
+        if any(STDIO_PATH in pair for pair in pairs):
+            parser.error(f"'{STDIO_PATH}' (stdin or stdout) cannot be part of a batch.")
+        if args.show_stats or args.stats_json:
+            parser.error("--profile and --stats-json apply to a single file; a batch has --summary.")
+
+    def single(run):
+        """Runs a single encode or decode, collecting statistics if asked to."""
+        if args.show_stats or args.stats_json:
+            run_with_stats(run, args.command, *args.paths, show=args.show_stats, json_path=args.stats_json)
+        else:
+            run()
+
     if args.command == "encode":
-        encode(args.input, args.output)
+        if args.channels < 1:
+            parser.error("--channels must be at least 1.")
+        if not 0 < args.block_size <= 0xFFFFFFFF:
+            parser.error("--block-size must be a positive 32-bit byte count.")
+        if not 0 <= args.fec <= RS_MAX_PARITY:
+            parser.error(f"--fec must be between 0 and {RS_MAX_PARITY} parity bytes.")
+        options = dict(profile=profile, channels=args.channels, framed=args.framed, block_size=args.block_size,
+                       fec_symbols=args.fec, compression=args.compress, describe=args.describe,
+                       synthesis=args.synthesis, edge_ramp=args.edge_ramp)
+        if pairs:
+            if run_batch("encode", pairs, options, args.jobs, args.summary):
+                sys.exit(1)
+        else:
+            single(lambda: encode(*args.paths, **options))
+    elif args.command == "decode" and args.max_latency is not None and not args.live \
+            and (pairs or args.paths[0] != STDIO_PATH):
+        parser.error("--max-latency only applies to --live (or input from stdin).")
+    elif args.command == "decode" and (args.live or not pairs and args.paths[0] == STDIO_PATH):
+        if pairs or args.lanes:
+            parser.error("Live decoding (--live or input from stdin) takes a single input and does not "
+                         "support --lanes.")
+        if args.max_latency is not None and args.max_latency <= 0:
+            parser.error("--max-latency must be positive.")
+        single(lambda: decode_live_source(*args.paths, detector=args.detector, profile=profile,
+                                          max_latency=args.max_latency))
     elif args.command == "decode":
-        decode(args.input, args.output)
+        options = dict(detector=args.detector, workers=args.workers, profile=profile, lanes=args.lanes)
+        if pairs:
+            # Files are the unit of parallelism; each one is decoded in a single process unless asked otherwise
+            if run_batch("decode", pairs, dict(options, workers=args.workers or 1), args.jobs, args.summary):
+                sys.exit(1)
+        else:
+            single(lambda: decode(*args.paths, **options))
+    elif args.command == "bench" and args.target == "startup":
+        benchmark_startup(args.runs)
+    elif args.command == "bench" and args.target == "fec":
+        benchmark_fec(args.bytes or 1 << 20, args.fec)
+    elif args.command == "bench" and args.target == "sync":
+        if args.modem_profile or args.bits is not None:
+            parser.error("bench sync covers every --bits width itself and takes no --modem-profile.")
+        benchmark_sync(args.trials, args.snr, SYMBOL_DURATION if args.symbol_duration is None else args.symbol_duration,
+                       args.tone_spacing, 1 if args.carriers is None else args.carriers)
+    elif args.command == "bench" and args.target == "sweep":
+        benchmark_sweep(args.bytes or 2000, args.durations, args.spacings, args.snr, args.gain_db,
+                        args.dc_offset, args.drift_ppm, syntheses=args.synthesis, edge_ramp=args.edge_ramp)
+    elif args.command == "bench":
+        benchmark_detectors(args.symbols, args.snr, profile)
 
 if __name__ == "__main__":
     main()